@@ -0,0 +1,289 @@
+"""
+Sources inside zip/tar archives, read without extracting
+A member is addressed by a virtual path: <archive path>/<member path>
+python -m soxcue.archive ARCHIVE MEMBER [OFFSET SIZE] writes a member to stdout
+"""
+
+import io
+import lzma
+import os
+import shlex
+import shutil
+import struct
+import sys
+import tarfile
+import zipfile
+import zlib
+from contextlib import ExitStack, contextmanager
+from functools import cache
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from mutagen import File, FileType
+
+ARCHIVE_SUFFIXES = (".zip", ".tar")
+# not seekable: every member read would decompress the archive up to it
+COMPRESSED_TAR_SUFFIXES = (".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# zip local file header: fixed size, name and extra field lengths offset
+ZIP_HEADER_SIZE = 30
+ZIP_HEADER_LENGTHS = 26
+# zip compression methods zipfile can read
+ZIP_METHODS = (
+    zipfile.ZIP_STORED,
+    zipfile.ZIP_DEFLATED,
+    zipfile.ZIP_BZIP2,
+    zipfile.ZIP_LZMA,
+)
+# opening or reading a member: damaged, encrypted, unsupported method
+READ_ERRORS = (
+    KeyError,
+    OSError,
+    EOFError,
+    RuntimeError,
+    NotImplementedError,
+    lzma.LZMAError,
+    zlib.error,
+    zipfile.BadZipFile,
+)
+
+
+class SoxcueArchiveError(Exception):
+    """soxcue archive error"""
+
+
+def is_archive_name(name: str) -> bool:
+    """
+    File name with a supported archive suffix
+    """
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_archive(path: Path) -> bool:
+    """
+    Existing archive file (a member path isn't one)
+    """
+    return is_archive_name(path.name) and path.is_file()
+
+
+def is_compressed_tar_name(name: str) -> bool:
+    """
+    File name of a compressed tar archive, unsupported
+    """
+    return name.lower().endswith(COMPRESSED_TAR_SUFFIXES)
+
+
+class MemberFile(io.RawIOBase):
+    """
+    Stored (uncompressed) member: size bytes at offset of the archive
+    Positioned reads, no archive parsing
+    """
+
+    def __init__(self, archive: Path, offset: int, size: int):
+        super().__init__()
+        self.fd = os.open(archive, os.O_RDONLY)
+        self.offset = offset
+        self.size = size
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = max(min(len(buffer), self.size - self.pos), 0)
+        read = os.preadv(self.fd, [memoryview(buffer)[:size]], self.offset + self.pos)
+        self.pos += read
+        return read
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: self.size}
+        self.pos = max(base[whence] + pos, 0)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def close(self) -> None:
+        if not self.closed:
+            os.close(self.fd)
+        super().close()
+
+
+@cache
+def split_member(path: Path) -> tuple[Path, str] | None:
+    """
+    (archive, member) of a path inside an archive, None for a plain file
+    """
+    for parent in reversed(path.parents):
+        if is_archive(parent):
+            return parent, path.relative_to(parent).as_posix()
+    return None
+
+
+def get_real_path(path: Path) -> Path:
+    """
+    Filesystem file holding the path: its archive or itself
+    """
+    return member[0] if (member := split_member(path)) else path
+
+
+def _get_zip_offset(fh: BinaryIO, info: zipfile.ZipInfo) -> int | None:
+    """
+    Data offset of a stored (not compressed/encrypted) zip member
+    """
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return None
+    fh.seek(info.header_offset + ZIP_HEADER_LENGTHS)
+    name_size, extra_size = struct.unpack("<HH", fh.read(4))
+    return info.header_offset + ZIP_HEADER_SIZE + name_size + extra_size
+
+
+@cache
+def _get_index(
+    archive: Path, mtime_ns: int
+) -> dict[str, tuple[str, int, int | None]]:
+    """
+    {member path: (member name, size, data offset)} of regular file members
+    data offset of stored members (tar, uncompressed zip), None otherwise
+    member paths are normalized ("./a/b" is "a/b")
+    encrypted zip members and unsupported compression methods are left out
+    """
+    # pylint: disable=unused-argument
+    try:
+        if archive.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(archive) as zfh, open(archive, "rb") as fh:
+                members = [
+                    (info.filename, info.file_size, _get_zip_offset(fh, info))
+                    for info in zfh.infolist()
+                    if not info.is_dir()
+                    and not info.flag_bits & 0x1
+                    and info.compress_type in ZIP_METHODS
+                ]
+        else:
+            # plain tar only: headers are read, member data skipped by seeking
+            with tarfile.open(archive, mode="r:") as tfh:
+                members = [
+                    (info.name, info.size, info.offset_data)
+                    for info in tfh
+                    if info.isfile()
+                ]
+    except (OSError, struct.error, zipfile.BadZipFile, tarfile.TarError) as exc:
+        raise SoxcueArchiveError(f"Couldn't read archive '{archive}'") from exc
+    return {Path(member[0]).as_posix(): member for member in members}
+
+
+def get_index(archive: Path) -> dict[str, tuple[str, int, int | None]]:
+    """
+    Archive members index, rebuilt once the archive changes
+    """
+    return _get_index(archive, os.stat(archive).st_mtime_ns)
+
+
+def list_members(archive: Path) -> list[str]:
+    """
+    Regular file members paths, read once per archive version
+    """
+    return list(get_index(archive))
+
+
+def source_stat(path: Path) -> os.stat_result:
+    """
+    Stat of the file holding the path, archive members change with it
+    """
+    return os.stat(get_real_path(path))
+
+
+def source_size(path: Path) -> int:
+    """
+    Uncompressed size of a file or an archive member
+    """
+    if not (member := split_member(path)):
+        return path.stat().st_size
+    archive, name = member
+    return get_index(archive)[name][1]
+
+
+@contextmanager
+def open_source(path: Path) -> Iterator[BinaryIO]:
+    """
+    Open a file or an archive member for reading
+    """
+    if not (member := split_member(path)):
+        with open(path, "rb") as fh:
+            yield fh
+        return
+
+    archive, name = member
+    with ExitStack() as stack:
+        try:
+            name, size, offset = get_index(archive)[name]
+            if offset is not None:
+                fh = stack.enter_context(
+                    io.BufferedReader(MemberFile(archive, offset, size))
+                )
+            else:
+                zfh = stack.enter_context(zipfile.ZipFile(archive))
+                fh = stack.enter_context(zfh.open(name))
+        except READ_ERRORS as exc:
+            raise SoxcueArchiveError(f"Couldn't read '{path}'") from exc
+        yield fh
+
+
+def read_source(path: Path) -> bytes:
+    """
+    Whole file or archive member, in memory (CUE sheets, covers)
+    """
+    with open_source(path) as fh:
+        try:
+            return fh.read()
+        except READ_ERRORS as exc:
+            raise SoxcueArchiveError(f"Couldn't read '{path}'") from exc
+
+
+def probe(path: Path) -> FileType | None:
+    """
+    mutagen file of a file or an archive member
+    """
+    if not split_member(path):
+        return File(path)
+    with open_source(path) as fh:
+        try:
+            return File(fh)
+        except READ_ERRORS as exc:
+            raise SoxcueArchiveError(f"Couldn't read '{path}'") from exc
+
+
+def get_stream_cmd(path: Path) -> str:
+    """
+    Shell command writing an archive member to stdout
+    Stored members are read at their indexed offset: the archive isn't parsed again
+    """
+    archive, name = split_member(path)
+    _, size, offset = get_index(archive)[name]
+    return shlex.join(
+        [sys.executable, "-m", "soxcue.archive", str(archive), name]
+        + ([str(offset), str(size)] if offset is not None else [])
+    )
+
+
+def main() -> None:
+    """
+    Stream an archive member to stdout
+    """
+    archive, name, *span = sys.argv[1:]
+    try:
+        with (
+            io.BufferedReader(MemberFile(Path(archive), *map(int, span)))
+            if span
+            else open_source(Path(archive, name))
+        ) as fh:
+            shutil.copyfileobj(fh, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+    except BrokenPipeError:
+        # the decoder stops reading once past the track end
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Decoder/encoder backends
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from subprocess import CalledProcessError, DEVNULL, run
+from soxcue.config import Config, OutputTarget
+from soxcue.loudness import METER_VOLUME, get_filters
+
+# micro-benchmark sample length, seconds
+BENCH_SECONDS = 30
+BENCH_FORMAT = {"rate": 44100, "bits": 16, "channels": 2}
+
+
+class SoxcueBackendsError(Exception):
+    """soxcue backends error"""
+
+
+class Backend(ABC):
+    """
+    Command line tool decoding a track range to raw PCM on stdout
+    and/or encoding raw PCM from stdin
+    PCM is signed little-endian, interleaved
+    """
+
+    name = ""
+    exe_name = ""
+    decodes: list[str] = []
+    encodes: list[str] = []
+    # encoded formats whose compression level is honoured
+    levels: list[str] = []
+
+    def is_installed(self) -> bool:
+        """
+        Tool found in PATH
+        """
+        return shutil.which(self.exe_name) is not None
+
+    def can_decode(self, src_format: str, stats: bool) -> bool:
+        """
+        stats: SoX stats effect levels requested
+        """
+        return not stats and src_format in self.decodes
+
+    def can_encode(self, target: OutputTarget) -> bool:
+        """
+        Every target setting honoured
+        Resampling/requantizing is left to SoX
+        """
+        return (
+            target.enc_format in self.encodes
+            and (target.comp_level is None or target.enc_format in self.levels)
+            and not target.rate
+            and not target.bits
+        )
+
+    @abstractmethod
+    def decode_cmd(
+        self, src_path: Path, start: float, end: float, pcm: dict[str, int]
+    ) -> str:
+        """
+        Decode src_path from start to end (0: file end) seconds
+        """
+
+    @abstractmethod
+    def encode_cmd(
+        self, pcm: dict[str, int], target: OutputTarget, dst_path: Path
+    ) -> str:
+        """
+        Encode stdin to dst_path
+        """
+
+    @staticmethod
+    def to_samples(seconds: float, pcm: dict[str, int]) -> int:
+        return round(seconds * pcm["rate"])
+
+
+class SoxBackend(Backend):
+    """
+    SoX, decodes/encodes every format it supports
+    The only backend applying the preset effects and measuring levels
+    """
+
+    name = "sox"
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.exe_name = config.runtime_.sox.exe_name
+        self.decodes = self.encodes = config.runtime_.sox.supported_formats
+        preset = config.runtime_.preset
+        self.sox_exe = f"{self.exe_name} -V1"
+        if preset.buffer:
+            self.sox_exe += f" --buffer {preset.buffer}"
+        if preset.multi_threaded:
+            self.sox_exe += " --multi-threaded"
+
+    def can_decode(self, src_format: str, stats: bool) -> bool:
+        return src_format in self.decodes
+
+    def can_encode(self, target: OutputTarget) -> bool:
+        return target.enc_format in self.encodes
+
+    @staticmethod
+    def get_trim(start: float, end: float) -> str:
+        # whole file (one file per track sheets)
+        if start == 0 and end == 0:
+            return ""
+        return f" trim {start}t{f' ={end}t' if end != 0 else ''}"
+
+    @staticmethod
+    def get_no_dither(target: OutputTarget) -> str:
+        return "" if target.dither else " -D"
+
+    @staticmethod
+    def get_output_args(target: OutputTarget) -> str:
+        return (
+            (f" -C {target.comp_level}" if target.comp_level is not None else "")
+            + (f" -r {target.rate}" if target.rate else "")
+            + (f" -b {target.bits}" if target.bits else "")
+        )
+
+    @staticmethod
+    def get_resample(target: OutputTarget) -> str:
+        return f" rate -{target.rate_quality}" if target.rate else ""
+
+    @staticmethod
+    def get_pcm_args(pcm_format: dict[str, int]) -> str:
+        """
+        SoX raw PCM (signed little-endian) format args
+        """
+        return (
+            f"-t raw -L -e signed-integer -b {pcm_format['bits']} "
+            f"-c {pcm_format['channels']} -r {pcm_format['rate']}"
+        )
+
+    def get_stats(self) -> str:
+        # passes audio through, reports peak levels for ReplayGain
+        return " stats" if self.config.output_.replaygain else ""
+
+    def meter_cmd(self, pcm: dict[str, int]) -> str:
+        """
+        K-weighted float PCM for the BS.1770 loudness meter
+        """
+        return (
+            f"{self.sox_exe} {self.get_pcm_args(pcm)} - "
+            f"-t raw -e floating-point -b 32 -L - vol {METER_VOLUME}"
+            + "".join(
+                f" biquad {' '.join(f'{x:.12g}' for x in coefs)}"
+                for coefs in get_filters(pcm["rate"])
+            )
+        )
+
+    def decode_cmd(
+        self,
+        src_path: Path,
+        start: float,
+        end: float,
+        pcm: dict[str, int],
+        src_type: str | None = None,
+    ) -> str:
+        """
+        src_type: source format, required for "-" (stdin)
+        """
+        return (
+            f"{self.sox_exe}{f' -t {src_type}' if src_type else ''} "
+            f'"{src_path}" {self.get_pcm_args(pcm)} -'
+            f"{self.get_trim(start, end)}{self.get_stats()}"
+        )
+
+    def encode_cmd(
+        self, pcm: dict[str, int], target: OutputTarget, dst_path: Path
+    ) -> str:
+        return (
+            f"{self.sox_exe}{self.get_no_dither(target)} {self.get_pcm_args(pcm)} -"
+            f"{self.get_output_args(target)} "
+            f'--comment="" "{dst_path}"{self.get_resample(target)}'
+        )
+
+    def convert_cmd(
+        self,
+        src_path: Path,
+        start: float,
+        end: float,
+        target: OutputTarget,
+        dst_path: Path,
+    ) -> str:
+        """
+        Single SoX process, no PCM pipe (no ReplayGain: measured on the pipe)
+        """
+        return (
+            f'{self.sox_exe}{self.get_no_dither(target)} "{src_path}"'
+            f"{self.get_output_args(target)} "
+            f'--comment="" "{dst_path}"{self.get_trim(start, end)}'
+            f"{self.get_resample(target)}"
+        )
+
+
+class FlacBackend(Backend):
+    """
+    Reference FLAC encoder/decoder
+    """
+
+    name = "flac"
+    exe_name = "flac"
+    decodes = ["flac"]
+    encodes = ["flac"]
+    levels = ["flac"]
+
+    raw_args = "--force-raw-format --endian=little --sign=signed"
+
+    def decode_cmd(
+        self, src_path: Path, start: float, end: float, pcm: dict[str, int]
+    ) -> str:
+        until = f" --until={self.to_samples(end, pcm)}" if end != 0 else ""
+        return (
+            f"{self.exe_name} -d -s -c {self.raw_args} "
+            f'--skip={self.to_samples(start, pcm)}{until} "{src_path}"'
+        )
+
+    def encode_cmd(
+        self, pcm: dict[str, int], target: OutputTarget, dst_path: Path
+    ) -> str:
+        level = f" -{int(target.comp_level)}" if target.comp_level is not None else ""
+        return (
+            f"{self.exe_name} -s -f {self.raw_args} "
+            f"--channels={pcm['channels']} --bps={pcm['bits']} "
+            f'--sample-rate={pcm["rate"]}{level} -o "{dst_path}" -'
+        )
+
+
+class WavpackBackend(Backend):
+    """
+    WavPack wavpack/wvunpack
+    """
+
+    name = "wavpack"
+    exe_name = "wavpack"
+    decodes = ["wv"]
+    encodes = ["wv"]
+    levels = ["wv"]
+
+    def is_installed(self) -> bool:
+        return super().is_installed() and shutil.which("wvunpack") is not None
+
+    def decode_cmd(
+        self, src_path: Path, start: float, end: float, pcm: dict[str, int]
+    ) -> str:
+        until = f" --until={self.to_samples(end, pcm)}" if end != 0 else ""
+        return (
+            f"wvunpack -q -y --raw --skip={self.to_samples(start, pcm)}{until} "
+            f'"{src_path}" -o -'
+        )
+
+    def encode_cmd(
+        self, pcm: dict[str, int], target: OutputTarget, dst_path: Path
+    ) -> str:
+        # WavPack has no numeric levels: up to 1 fast, 2 default, 3+ high
+        mode = ""
+        if target.comp_level is not None:
+            mode = (
+                " -f"
+                if target.comp_level <= 1
+                else " -h" if target.comp_level > 2 else ""
+            )
+        return (
+            f"{self.exe_name} -q -y "
+            f"--raw-pcm={pcm['rate']},{pcm['bits']}s,{pcm['channels']},le{mode} "
+            f'- -o "{dst_path}"'
+        )
+
+
+class FfmpegBackend(Backend):
+    """
+    FFmpeg, no resampling/requantizing (left to SoX)
+    """
+
+    name = "ffmpeg"
+    exe_name = "ffmpeg"
+    decodes = [
+        "aiff",
+        "aif",
+        "ape",
+        "flac",
+        "m4a",
+        "mp3",
+        "ogg",
+        "opus",
+        "tta",
+        "wav",
+        "wv",
+    ]
+    encodes = ["aiff", "flac", "mp3", "ogg", "opus", "wav", "wv"]
+    # SoX -C means bitrate/quality for lossy formats, no FFmpeg equivalent
+    levels = ["flac"]
+
+    @staticmethod
+    def get_raw_args(pcm: dict[str, int]) -> str:
+        return f"-f s{pcm['bits']}le -ar {pcm['rate']} -ac {pcm['channels']}"
+
+    def decode_cmd(
+        self, src_path: Path, start: float, end: float, pcm: dict[str, int]
+    ) -> str:
+        # seek after the input: sample accurate
+        until = f" -to {end}" if end != 0 else ""
+        return (
+            f'{self.exe_name} -v error -nostdin -i "{src_path}" -ss {start}{until} '
+            f"-map 0:a:0 -c:a pcm_s{pcm['bits']}le {self.get_raw_args(pcm)} -"
+        )
+
+    def encode_cmd(
+        self, pcm: dict[str, int], target: OutputTarget, dst_path: Path
+    ) -> str:
+        level = (
+            f" -compression_level {int(target.comp_level)}"
+            if target.comp_level is not None
+            else ""
+        )
+        return (
+            f"{self.exe_name} -v error -nostdin {self.get_raw_args(pcm)} -i - "
+            f'-map_metadata -1{level} -y "{dst_path}"'
+        )
+
+
+class BackendSelector:
+    """
+    Installed backends, fastest decoder/encoder per input -> output format pair
+    Picked by a one-time micro-benchmark, cached per user
+    """
+
+    def __init__(self, config: Config, backend: str = "auto"):
+        """
+        backend: "auto", "sox" or a backend name to prefer where it applies
+        """
+        self.sox = SoxBackend(config)
+        self.backend = backend
+        self.backends: list[Backend] = [self.sox] + (
+            [
+                x
+                for x in [FlacBackend(), WavpackBackend(), FfmpegBackend()]
+                if x.is_installed()
+            ]
+            if backend != "sox"
+            else []
+        )
+        self.cache_path = Path(
+            os.environ.get("XDG_CACHE_HOME", Path.home().joinpath(".cache")),
+            "soxcue",
+            "backends.json",
+        )
+        try:
+            with open(self.cache_path, encoding="utf-8") as fh:
+                self.selected: dict[str, dict] = json.load(fh)
+        except (OSError, ValueError):
+            self.selected = {}
+
+    def get(self, name: str) -> Backend:
+        return [x for x in self.backends if x.name == name][0]
+
+    def select(
+        self, src_format: str, target: OutputTarget, stats: bool
+    ) -> tuple[Backend, Backend]:
+        """
+        (decoder, encoder) for a format pair
+        """
+        decoders = [x for x in self.backends if x.can_decode(src_format, stats)]
+        encoders = [x for x in self.backends if x.can_encode(target)]
+        if len(decoders) == len(encoders) == 1:
+            return decoders[0], encoders[0]
+
+        if self.backend != "auto":
+            return ([x for x in decoders if x.name == self.backend] + decoders)[0], (
+                [x for x in encoders if x.name == self.backend] + encoders
+            )[0]
+
+        pair = self.get_pair_key(src_format, target)
+        if pair not in self.selected:
+            self.selected[pair] = self.benchmark(src_format, target, decoders, encoders)
+            self.save()
+
+        selected = self.selected[pair]
+        if stats or selected["decoder"] not in [x.name for x in decoders]:
+            return self.sox, self.get(selected["encoder"])
+        return self.get(selected["decoder"]), self.get(selected["encoder"])
+
+    def get_pair_key(self, src_format: str, target: OutputTarget) -> str:
+        """
+        Benchmark cache key: formats, encode settings and installed backends
+        """
+        return ":".join(
+            [
+                src_format,
+                target.enc_format,
+                f"C={target.comp_level}",
+                f"rate={target.rate}",
+                f"bits={target.bits}",
+                f"quality={target.rate_quality}",
+                f"dither={target.dither}",
+                ",".join(x.name for x in self.backends),
+            ]
+        )
+
+    def benchmark(
+        self,
+        src_format: str,
+        target: OutputTarget,
+        decoders: list[Backend],
+        encoders: list[Backend],
+    ) -> dict:
+        """
+        Time every decoder | encoder pipe over a SoX generated sample
+        SoX for both if the sample can't be produced
+        """
+        timings = {}
+        with tempfile.TemporaryDirectory(prefix="soxcue-backends-") as tmp_dir:
+            sample = Path(tmp_dir, f"sample.{src_format}")
+            dst_path = Path(tmp_dir, f"out.{target.enc_format}")
+            try:
+                run(
+                    f"{self.sox.exe_name} -V1 -n -r {BENCH_FORMAT['rate']} "
+                    f"-b {BENCH_FORMAT['bits']} -c {BENCH_FORMAT['channels']} "
+                    f'"{sample}" synth {BENCH_SECONDS} pinknoise',
+                    shell=True,
+                    check=True,
+                    stdout=DEVNULL,
+                    stderr=DEVNULL,
+                )
+            except CalledProcessError:
+                return {"decoder": "sox", "encoder": "sox", "timings": {}}
+
+            for decoder in decoders:
+                for encoder in encoders:
+                    started = time.monotonic()
+                    try:
+                        run(
+                            f"{decoder.decode_cmd(sample, 0, 0, BENCH_FORMAT)} | "
+                            f"{encoder.encode_cmd(BENCH_FORMAT, target, dst_path)}",
+                            shell=True,
+                            check=True,
+                            stdout=DEVNULL,
+                            stderr=DEVNULL,
+                        )
+                    except CalledProcessError:
+                        continue
+                    timings[f"{decoder.name}|{encoder.name}"] = round(
+                        time.monotonic() - started, 4
+                    )
+
+        if not timings:
+            return {"decoder": "sox", "encoder": "sox", "timings": {}}
+        decoder, encoder = min(timings, key=timings.get).split("|")
+        return {"decoder": decoder, "encoder": encoder, "timings": timings}
+
+    def save(self) -> None:
+        """
+        Atomically write selections cache
+        """
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.selected, fh, indent=1)
+        os.replace(tmp_path, self.cache_path)
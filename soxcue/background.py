@@ -0,0 +1,193 @@
+"""
+Background mode: low CPU/IO priority, cgroup v2 limits, pressure based throttling
+"""
+
+import ctypes
+import os
+import platform
+import time
+from functools import cache
+from pathlib import Path
+from typing import Callable
+
+# ioprio_set syscall number per machine
+IOPRIO_SET = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "riscv64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "s390x": 282,
+}
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+
+# pressure stall information
+PSI_DIR = Path("/proc/pressure")
+PSI_RESOURCES = ["cpu", "io", "memory"]
+PROC_DIR = Path("/proc")
+
+# a background job is running in this (worker) process
+BACKGROUND = False
+
+
+class SoxcueBackgroundError(Exception):
+    """soxcue background error"""
+
+
+@cache
+def get_libc() -> ctypes.CDLL:
+    """
+    libc, loaded once: not in a forked child before exec
+    """
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def set_idle_io() -> bool:
+    """
+    Idle I/O scheduling class for the calling process
+    """
+    if (number := IOPRIO_SET.get(platform.machine())) is None:
+        return False
+    return (
+        get_libc().syscall(
+            number,
+            IOPRIO_WHO_PROCESS,
+            0,
+            IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT,
+        )
+        == 0
+    )
+
+
+def set_background() -> None:
+    """
+    Lowest CPU and I/O priority for the calling process, inherited by its children
+    Best effort: unsupported or denied settings are skipped
+    Runs in job processes between fork and exec (Popen preexec_fn)
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, 19)
+    except OSError:
+        pass
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (AttributeError, OSError):
+        pass
+    set_idle_io()
+
+
+def background_call(func: Callable, args: tuple):
+    """
+    Worker side: run a job, its processes backgrounded (see Watchdog.popen)
+    The worker keeps its priority: it can't be raised back unprivileged,
+    later foreground jobs in the same worker would stay backgrounded
+    """
+    global BACKGROUND  # pylint: disable=global-statement
+    get_libc()
+    BACKGROUND = True
+    try:
+        return func(*args)
+    finally:
+        BACKGROUND = False
+
+
+def is_background() -> bool:
+    """
+    A background job is running in this (worker) process
+    """
+    return BACKGROUND
+
+
+def get_run_delay(pgids: set[int], proc_dir: Path = PROC_DIR) -> float:
+    """
+    Seconds the processes of the groups waited for a CPU (run queue), the
+    longest one: starved idle priority jobs wait, stalled ones don't
+    0 without schedstat support
+    """
+    delays = [0]
+    for entry in proc_dir.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # pgrp is the 3rd field after the parenthesized command name
+            stat = entry.joinpath("stat").read_text(encoding="utf-8")
+            if int(stat.rpartition(")")[2].split()[2]) not in pgids:
+                continue
+            schedstat = entry.joinpath("schedstat").read_text(encoding="utf-8")
+            delays.append(int(schedstat.split()[1]))
+        except (OSError, IndexError, ValueError):
+            continue
+    return max(delays) / 1e9
+
+
+def join_cgroup(
+    cgroup_dir: Path, cpu_weight: int | None = None, memory_max: str | None = None
+) -> Path:
+    """
+    Move the calling process into a 'soxcue' child of a delegated cgroup v2
+    directory, with cpu.weight/memory.max limits; children inherit it
+    """
+    path = cgroup_dir / "soxcue"
+    try:
+        path.mkdir(exist_ok=True)
+        for name, value in [("cpu.weight", cpu_weight), ("memory.max", memory_max)]:
+            if value is not None:
+                path.joinpath(name).write_text(f"{value}\n", encoding="utf-8")
+        path.joinpath("cgroup.procs").write_text(f"{os.getpid()}\n", encoding="utf-8")
+    except OSError as exc:
+        raise SoxcueBackgroundError(
+            f"Couldn't join cgroup '{path}' (is it a delegated cgroup v2 directory "
+            "with cpu/memory controllers enabled?)"
+        ) from exc
+    return path
+
+
+class PressureThrottle:
+    """
+    Concurrent jobs limit following system pressure (PSI "some avg10" %):
+    one job less while any resource is above the threshold,
+    one job more while all are below half of it
+    """
+
+    def __init__(
+        self, threshold: float = 10.0, interval: float = 2.0, psi_dir: Path = PSI_DIR
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.psi_dir = psi_dir
+        self.limit: int | None = None
+        self.checked = 0.0
+
+    def get_pressure(self) -> float | None:
+        """
+        Highest pressure, None without PSI support
+        """
+        pressures = []
+        for resource in PSI_RESOURCES:
+            try:
+                with open(self.psi_dir / resource, encoding="utf-8") as fh:
+                    some = fh.readline().split()
+                pressures.append(float(some[1].split("=")[1]))
+            except (OSError, IndexError, ValueError):
+                continue
+        return max(pressures, default=None)
+
+    def get_limit(self, max_jobs: int) -> int:
+        """
+        Jobs limit now, at most max_jobs
+        """
+        if self.limit is None:
+            self.limit = max_jobs
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            self.checked = now
+            if (pressure := self.get_pressure()) is not None:
+                if pressure > self.threshold:
+                    self.limit = max(self.limit - 1, 1)
+                elif pressure < self.threshold / 2:
+                    self.limit = min(self.limit + 1, max_jobs)
+        return min(self.limit, max_jobs)
@@ -0,0 +1,132 @@
+"""
+Presets throughput benchmark
+python -m soxcue.bench [-P PRESET] [-f FORMAT] src_path
+"""
+
+import argparse
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+from soxcue.archive import source_size
+from soxcue.config import (
+    PRESETS,
+    Config,
+    ConfigInput,
+    ConfigOutput,
+    ConfigRuntime,
+    SoxProperties,
+)
+from soxcue.engine import SoxcueEngine
+from soxcue.sheets import SoxcueSheets
+
+
+class SoxcueBenchError(Exception):
+    """soxcue bench error"""
+
+
+def bench(config: Config, presets: list[str], engine: SoxcueEngine) -> list[dict]:
+    """
+    Split all CUE sheets of the config with every preset into a scratch directory
+    Return per preset throughput
+    """
+    results = []
+    for name in presets:
+        with tempfile.TemporaryDirectory(prefix="soxcue-bench-") as dst_dir:
+            preset_config = replace(
+                config,
+                output_=replace(config.output_, dst_dir=Path(dst_dir)),
+                runtime_=replace(config.runtime_, preset=PRESETS[name]),
+            )
+            cue_sheets = SoxcueSheets(config=preset_config).cue_sheets
+            tracks = [track for sheet in cue_sheets for track in sheet.tracks]
+            audio_seconds = sum(engine.get_track_length(track) for track in tracks)
+            src_bytes = sum(
+                {
+                    track.src_path: source_size(track.src_path) for track in tracks
+                }.values()
+            )
+
+            started = time.monotonic()
+            for cue_sheet in cue_sheets:
+                engine.process_sheet(cue_sheet=cue_sheet, config=preset_config)
+            elapsed = time.monotonic() - started
+
+            dst_bytes = sum(
+                x.stat().st_size for x in Path(dst_dir).rglob("*") if x.is_file()
+            )
+
+        results.append(
+            {
+                "preset": name,
+                "tracks": len(tracks),
+                "seconds": elapsed,
+                "mb_per_sec": src_bytes / 1024 / 1024 / (elapsed or 1e-9),
+                "realtime": audio_seconds / (elapsed or 1e-9),
+                "output_mb": dst_bytes / 1024 / 1024,
+            }
+        )
+    return results
+
+
+def main() -> None:
+    """
+    Parse cmd args, run benchmark, print results
+    """
+    argparser = argparse.ArgumentParser(prog="soxcue.bench")
+    argparser.add_argument("src_path", type=Path)
+    argparser.add_argument(
+        "-f",
+        "--format",
+        help="output file format. Default: flac",
+        type=str,
+        default="flac",
+    )
+    argparser.add_argument(
+        "-P",
+        "--preset",
+        help="preset to measure, repeatable. Default: all",
+        choices=list(PRESETS),
+        action="append",
+        default=None,
+    )
+    argparser.add_argument(
+        "-s",
+        "--sox-exe",
+        help="SoX command name (or full path to an executable). Default: sox",
+        type=str,
+        default="sox",
+    )
+    parsed = argparser.parse_args()
+
+    config = Config(
+        input_=ConfigInput(src_path=parsed.src_path),
+        output_=ConfigOutput(dst_dir=None, cmd_comment=None, enc_format=parsed.format),
+        runtime_=ConfigRuntime(
+            cue_encoding=None,
+            time_wait=0,
+            naming_spec="#c - #d - #a/#n - #p - #t",
+            sox=SoxProperties(exe_name=parsed.sox_exe, comp_level=None),
+        ),
+    )
+
+    table = Table("Preset", "Tracks", "Seconds", "MB/s", "x realtime", "Output MB")
+    with SoxcueEngine() as engine:
+        for result in bench(
+            config, parsed.preset if parsed.preset else list(PRESETS), engine
+        ):
+            table.add_row(
+                result["preset"],
+                str(result["tracks"]),
+                f"{result['seconds']:.2f}",
+                f"{result['mb_per_sec']:.1f}",
+                f"{result['realtime']:.1f}",
+                f"{result['output_mb']:.1f}",
+            )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
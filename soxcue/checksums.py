@@ -0,0 +1,94 @@
+"""
+Streaming PCM checksums
+"""
+
+import hashlib
+import sys
+from array import array
+from itertools import repeat
+from operator import mul, rshift
+
+# AccurateRip skips 5 CD frames at the start of the first and the end of the last track
+AR_SKIP = 588 * 5
+MASK32 = 0xFFFFFFFF
+# PcmChecksums.result() keys
+CHECKSUMS = ["md5", "samples", "arv1", "arv2"]
+
+
+class PcmChecksums:
+    """
+    MD5 (FLAC STREAMINFO compatible for signed little-endian PCM)
+    and AccurateRip v1/v2 CRCs (CDDA only) of a PCM stream fed in chunks
+    """
+
+    def __init__(self, accuraterip: tuple[bool, bool] | None = None):
+        """
+        accuraterip: (first track, last track) or None to skip CRCs
+        """
+        self.md5 = hashlib.md5()
+        self.size = 0
+        self.accuraterip = accuraterip
+        self.arv1 = 0
+        self.arv2 = 0
+        # 1-based AccurateRip sample position of the next sample
+        self.position = 1
+        self.pending = b""
+
+    def update(self, chunk: bytes) -> None:
+        """
+        Feed the next PCM chunk
+        """
+        self.md5.update(chunk)
+        self.size += len(chunk)
+
+        if self.accuraterip is None:
+            return
+
+        data = self.pending + chunk
+        # the last track end is excluded, hold it back until we know where it is
+        keep = len(data) % 4 + (AR_SKIP * 4 if self.accuraterip[1] else 0)
+        keep = min(keep, len(data))
+        self.pending = data[len(data) - keep :]
+        self._update_crc(data[: len(data) - keep])
+
+    def _update_crc(self, data: bytes) -> None:
+        """
+        Add 32-bit (left + right 16-bit) samples to AccurateRip CRCs
+        """
+        if not data:
+            return
+
+        samples = array("I", data)
+        if sys.byteorder == "big":
+            samples.byteswap()
+
+        start = self.position
+        self.position += len(samples)
+        if self.accuraterip[0] and start < AR_SKIP - 1:
+            skip = min(AR_SKIP - 1 - start, len(samples))
+            samples = samples[skip:]
+            start += skip
+
+        products = list(map(mul, samples, range(start, start + len(samples))))
+        total = sum(products)
+        self.arv1 = (self.arv1 + total) & MASK32
+        # v2 adds both 32-bit halves of every 64-bit product
+        self.arv2 = (
+            self.arv2 + total - MASK32 * sum(map(rshift, products, repeat(32)))
+        ) & MASK32
+
+    def result(self, sample_size: int) -> dict[str, str | int]:
+        """
+        Final checksums
+        sample_size: bytes per (all channels) sample
+        """
+        checksums = {
+            "md5": self.md5.hexdigest(),
+            "samples": self.size // sample_size,
+        }
+        if self.accuraterip is not None:
+            if not self.accuraterip[1]:
+                self._update_crc(self.pending[: len(self.pending) // 4 * 4])
+            checksums["arv1"] = f"{self.arv1:08x}"
+            checksums["arv2"] = f"{self.arv2:08x}"
+        return checksums
@@ -4,27 +4,100 @@
 Command line parser
 """
 import argparse
+import re
 import shutil
 import signal
 import os
+import sys
+import tempfile
 import textwrap
 from pathlib import Path
 from rich.console import Console
+from soxcue.background import join_cgroup
 from soxcue.config import (
     SoxProperties,
     ConfigInput,
     ConfigOutput,
     ConfigRuntime,
     Config,
+    OutputTarget,
+    PRESETS,
+    SimCost,
 )
+from soxcue.engine import SoxcueEngine, SoxcueEngineError
 from soxcue.process import SoxcueProcess
+from soxcue.profiling import profile
 from soxcue.sheets import SoxcueSheets
+from soxcue.stream import TarStream
+from soxcue.verify import SoxcueVerify
 
 
 class SoxcueError(Exception):
     """SoxcueError"""
 
 
+def device_limit(value: str) -> tuple[str, float]:
+    """
+    Parse '[PATH=]VALUE' device limit
+    """
+    path, _, limit = value.rpartition("=")
+    try:
+        if (limit := float(limit)) <= 0:
+            raise ValueError
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid device limit '{value}'") from exc
+    return path, limit
+
+
+def sim_cost(value: str) -> SimCost:
+    """
+    Parse 'KEY=VALUE[:KEY=VALUE...]' simulated backend cost model
+    """
+    try:
+        return SimCost(
+            **{
+                k: int(v) if k == "seed" else float(v)
+                for k, v in (option.split("=") for option in value.split(":"))
+            }
+        )
+    # unknown key or value
+    except (TypeError, ValueError) as exc:
+        raise argparse.ArgumentTypeError(f"invalid cost model '{value}'") from exc
+
+
+def output_target(value: str) -> OutputTarget:
+    """
+    Parse 'FORMAT[:C=LEVEL][:rate=HZ][:bits=BITS][:quality=Q][:dither=0|1]
+    [:dir=PATH][:naming=SPEC]' output target
+    """
+    enc_format, *options = re.split(
+        r":(?=(?:C|rate|bits|quality|dither|dir|naming)=)", value
+    )
+    target = OutputTarget(enc_format=enc_format)
+    try:
+        for option in options:
+            k, _, v = option.partition("=")
+            if k == "C":
+                target.comp_level = float(v)
+            elif k == "rate":
+                target.rate = int(v)
+            elif k == "bits":
+                target.bits = int(v)
+            elif k == "quality":
+                if v not in ["q", "l", "m", "h", "v"]:
+                    raise ValueError
+                target.rate_quality = v
+            elif k == "dither":
+                target.dither = bool(int(v))
+            elif k == "dir":
+                target.dst_dir = Path(v)
+            else:
+                target.naming_spec = v
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid output format '{value}'") from exc
+    return target
+
+
 def main() -> None:
     """
     Parse cmd args
@@ -33,17 +106,22 @@ def main() -> None:
     """
 
     console = Console()
+    # engine in use, aborted on ctrl+c/kill
+    engines: list[SoxcueEngine] = []
 
     # pylint: disable=unused-argument
     def signal_handler(sig, frame) -> None:
         """
-        Handle ctrl+c
+        Handle ctrl+c/kill: stop jobs, remove partial outputs
         """
         # take cli cursor back from rich
         console.show_cursor(show=True)
-        os._exit(0)
+        for engine in engines:
+            engine.abort()
+        os._exit(128 + sig)
 
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
 
     argparser = argparse.ArgumentParser(
         prog="soxcue",
@@ -66,9 +144,66 @@ def main() -> None:
     )
     argparser.add_argument(
         "src_path",
-        help="path to a CUE file or a directory",
+        help="path to a CUE file, a directory or a .zip/.tar archive",
         type=Path,
     )
+    argparser.add_argument(
+        "--archives",
+        help="look inside .zip/.tar archives found while searching src_path",
+        action="store_true",
+    )
+    argparser.add_argument(
+        "--background",
+        help=(
+            "shared host mode: jobs run at idle CPU/IO priority (nice 19, "
+            "SCHED_IDLE, idle I/O class) and fewer of them while system pressure "
+            "(PSI) is above --pressure-threshold"
+        ),
+        action="store_true",
+    )
+    argparser.add_argument(
+        "--pressure-threshold",
+        help=(
+            "background mode: PSI 'some avg10' %% of cpu/io/memory above which "
+            "concurrent jobs are reduced, raised again below half of it. Default: 10"
+        ),
+        type=float,
+        default=10.0,
+    )
+    argparser.add_argument(
+        "--cgroup",
+        help=(
+            "delegated cgroup v2 directory to run in, "
+            "in a 'soxcue' child with --cgroup-cpu-weight/--cgroup-memory-max"
+        ),
+        type=Path,
+        default=None,
+    )
+    argparser.add_argument(
+        "--cgroup-cpu-weight",
+        help="cgroup cpu.weight (1-10000, system default 100). Default: 10",
+        type=int,
+        default=10,
+    )
+    argparser.add_argument(
+        "--cgroup-memory-max",
+        help="cgroup memory.max, e.g. 2G. Default: no limit",
+        type=str,
+        default=None,
+    )
+    argparser.add_argument(
+        "-B",
+        "--backend",
+        help=(
+            "decoder/encoder backend: 'auto' picks the fastest installed one "
+            "(SoX, flac, wavpack, ffmpeg) per format pair by a one-time benchmark "
+            "cached in ~/.cache/soxcue/backends.json, a name prefers that backend "
+            "where it applies. 'sim' simulates jobs (see --sim-cost) and writes "
+            "empty outputs, for load tests without SoX. Default: auto"
+        ),
+        choices=["auto", "sox", "flac", "wavpack", "ffmpeg", "sim"],
+        default="auto",
+    )
     argparser.add_argument(
         "-c",
         "--comment",
@@ -76,6 +211,17 @@ def main() -> None:
         type=str,
         default=None,
     )
+    argparser.add_argument(
+        "-b",
+        "--bandwidth",
+        help=(
+            "read bandwidth cap in MB/s as '[PATH=]MBPS', "
+            "PATH selects the device, repeatable. Default: no cap"
+        ),
+        type=device_limit,
+        action="append",
+        default=[],
+    )
     argparser.add_argument(
         "-C",
         "--compression-level",
@@ -90,6 +236,18 @@ def main() -> None:
         type=Path,
         default=None,
     )
+    argparser.add_argument(
+        "-D",
+        "--device-jobs",
+        help=(
+            "concurrent jobs per device as '[PATH=]JOBS', "
+            "PATH selects the device, repeatable. "
+            "Default: 2 for spinning disks, otherwise no limit"
+        ),
+        type=device_limit,
+        action="append",
+        default=[],
+    )
     argparser.add_argument(
         "-e",
         "--encoding",
@@ -100,9 +258,56 @@ def main() -> None:
     argparser.add_argument(
         "-f",
         "--format",
-        help="output file format (supported by SoX). Default: flac",
+        help=(
+            "output file format (supported by SoX) as 'FORMAT[:C=LEVEL][:rate=HZ]"
+            "[:bits=BITS][:quality=q|l|m|h|v][:dither=0|1][:dir=PATH][:naming=SPEC]', "
+            "repeat to encode every track to several formats from a single decode, "
+            "options default to -C/-d/-n and the preset. Default: flac"
+        ),
+        type=output_target,
+        action="append",
+        default=None,
+    )
+    argparser.add_argument(
+        "-F",
+        "--force",
+        help=(
+            "re-encode every track, by default tracks encoded earlier "
+            "with unchanged audio settings are only retagged/renamed"
+        ),
+        action="store_true",
+    )
+    argparser.add_argument(
+        "-g",
+        "--replaygain",
+        help="write track and album ReplayGain tags measured while splitting",
+        action="store_true",
+    )
+    argparser.add_argument(
+        "-i",
+        "--include",
+        help=(
+            "process only CUE sheets matching a glob (file name or path relative "
+            "to src_path), repeatable. Default: all"
+        ),
         type=str,
-        default="flac",
+        action="append",
+        default=[],
+    )
+    argparser.add_argument(
+        "-k",
+        "--checksums",
+        help=(
+            "record PCM MD5 and AccurateRip v1/v2 CRCs (CD audio) of every track "
+            "computed while splitting"
+        ),
+        action="store_true",
+    )
+    argparser.add_argument(
+        "--max-depth",
+        help="search CUE sheets at most x directory levels below src_path",
+        type=int,
+        default=None,
     )
     argparser.add_argument(
         "-n",
@@ -111,6 +316,35 @@ def main() -> None:
         type=str,
         default="#c - #d - #a/#n - #p - #t",
     )
+    argparser.add_argument(
+        "-p",
+        "--prefetch",
+        help=(
+            "read ahead the next CUE sheet source files into the page cache "
+            "while the current one is processed, up to MB megabytes. Default: 0 (off)"
+        ),
+        type=int,
+        default=0,
+    )
+    argparser.add_argument(
+        "-P",
+        "--preset",
+        help=(
+            "speed/quality preset setting compression level, resampler quality, "
+            "dither and SoX buffers: fast, balanced or archival. Default: balanced"
+        ),
+        choices=list(PRESETS),
+        default="balanced",
+    )
+    argparser.add_argument(
+        "--sheets",
+        help=(
+            "CUE sheets processed at once: jobs of later sheets use the workers "
+            "(and devices) the current one leaves idle. Default: 4"
+        ),
+        type=int,
+        default=4,
+    )
     argparser.add_argument(
         "-s",
         "--sox-exe",
@@ -118,46 +352,226 @@ def main() -> None:
         type=str,
         default="sox",
     )
+    argparser.add_argument(
+        "-S",
+        "--store",
+        help=(
+            "content addressed store directory, tracks already encoded "
+            "from the same source/range/settings are reused (reflink or copy) "
+            "and only tagged. Default: no store"
+        ),
+        type=Path,
+        default=None,
+    )
+    argparser.add_argument(
+        "-r",
+        "--retries",
+        help="retry failed or timed out track jobs x times. Default: 2",
+        type=int,
+        default=2,
+    )
+    argparser.add_argument(
+        "--profile",
+        help=(
+            "write per process and stage (discover, process, job) pstats and "
+            "collapsed stacks (flamegraph) profiles into this directory. "
+            "Default: no profiling"
+        ),
+        type=Path,
+        default=None,
+    )
+    argparser.add_argument(
+        "--sim-cost",
+        help=(
+            "simulated backend cost model 'KEY=VALUE[:KEY=VALUE...]', keys: "
+            "fixed (seconds per job), per_second (seconds per track second), "
+            "jitter (fraction), failure_rate, slow_rate, slow_factor, "
+            "hang_rate (hung until --timeout kills them), seed. "
+            "Default: fixed=0.01:per_second=0.001:jitter=0.2"
+        ),
+        type=sim_cost,
+        default=SimCost(),
+    )
+    argparser.add_argument(
+        "--tar",
+        help=(
+            "write finished tracks as a tar stream to stdout, in completion order, "
+            "nothing is written to the output directory. Default: write files"
+        ),
+        action="store_true",
+    )
+    argparser.add_argument(
+        "--resume",
+        help=(
+            "keep tracks completely encoded by an interrupted run "
+            "and only tag them. Default: re-encode them"
+        ),
+        action="store_true",
+    )
+    argparser.add_argument(
+        "-t",
+        "--timeout",
+        help=(
+            "track job timeout: x seconds plus --timeout-factor times "
+            "the track length, 0 disables. Default: 60"
+        ),
+        type=float,
+        default=60.0,
+    )
+    argparser.add_argument(
+        "--timeout-factor",
+        help="track length multiplier added to --timeout. Default: 2",
+        type=float,
+        default=2.0,
+    )
+    argparser.add_argument(
+        "-V",
+        "--verify",
+        help="verify existing tracks against recorded checksums, don't split",
+        action="store_true",
+    )
     argparser.add_argument(
         "-w",
         "--wait",
-        help="delay each CUE sheet processing by x seconds. Default: 5",
+        help="delay processing by x seconds. Default: 5",
         type=int,
         default=5,
     )
+    argparser.add_argument(
+        "-x",
+        "--exclude",
+        help=(
+            "skip directories and CUE sheets matching a glob (name or path "
+            "relative to src_path), repeatable. "
+            "soxcue output directories are always skipped"
+        ),
+        type=str,
+        action="append",
+        default=[],
+    )
     parsed = argparser.parse_args()
 
-    if not shutil.which(parsed.sox_exe):
+    if parsed.backend != "sim" and not shutil.which(parsed.sox_exe):
         raise SoxcueError(f"{parsed.sox_exe} command not found\n")
 
+    # first format is the main output
+    main_target, *targets = (
+        parsed.format if parsed.format else [OutputTarget(enc_format="flac")]
+    )
+
+    dst_dir = main_target.dst_dir if main_target.dst_dir else parsed.output_dir
+    if parsed.tar:
+        if sys.stdout.isatty():
+            raise SoxcueError("Won't write a tar stream to a terminal\n")
+        if any(target.dst_dir for target in targets):
+            raise SoxcueError("Output format dir can't be used with --tar\n")
+        # stdout carries the tar stream
+        console = Console(stderr=True)
+        # outputs only stay there until streamed
+        scratch = tempfile.TemporaryDirectory(prefix="soxcue-tar-")
+        dst_dir = Path(scratch.name)
+
     config = Config(
-        input_=ConfigInput(src_path=parsed.src_path),
+        input_=ConfigInput(
+            src_path=parsed.src_path,
+            include=parsed.include,
+            exclude=parsed.exclude,
+            max_depth=parsed.max_depth,
+            archives=parsed.archives,
+        ),
         output_=ConfigOutput(
-            dst_dir=parsed.output_dir,
+            dst_dir=dst_dir,
             cmd_comment=parsed.comment,
-            enc_format=parsed.format,
+            enc_format=main_target.enc_format,
+            replaygain=parsed.replaygain,
+            checksums=parsed.checksums,
+            targets=targets,
+            store_dir=parsed.store,
+            main_target=main_target,
+            force=parsed.force,
+            tar=parsed.tar,
         ),
         runtime_=ConfigRuntime(
             cue_encoding=parsed.encoding,
             time_wait=parsed.wait,
-            naming_spec=parsed.naming_spec,
+            naming_spec=(
+                main_target.naming_spec
+                if main_target.naming_spec
+                else parsed.naming_spec
+            ),
+            device_jobs={k: max(int(v), 1) for k, v in parsed.device_jobs},
+            bandwidth=dict(parsed.bandwidth),
+            timeout=parsed.timeout,
+            timeout_factor=parsed.timeout_factor,
+            retries=max(parsed.retries, 0),
+            resume=parsed.resume,
+            profile_dir=parsed.profile,
+            preset=PRESETS[parsed.preset],
+            backend=parsed.backend,
+            sim_cost=parsed.sim_cost,
+            background=parsed.background,
+            pressure_threshold=parsed.pressure_threshold,
             sox=SoxProperties(
-                exe_name=parsed.sox_exe,
-                comp_level=parsed.compression_level,
+                exe_name=parsed.sox_exe if parsed.backend != "sim" else None,
+                comp_level=(
+                    main_target.comp_level
+                    if main_target.comp_level is not None
+                    else parsed.compression_level
+                ),
             ),
         ),
     )
 
-    if config.input_.src_path.is_dir():
-        status = console.status("Searching for cue files\n")
-        status.start()
-        cue_sheets = SoxcueSheets(config=config).cue_sheets
-        status.stop()
-    else:
-        cue_sheets = SoxcueSheets(config=config).cue_sheets
+    if parsed.verify:
+        with profile(parsed.profile, "verify"):
+            failures = SoxcueVerify(config=config, console=console).verify()
+        if failures:
+            raise SoxcueError(f"{failures} track(s) failed verification\n")
+        return
+
+    with profile(parsed.profile, "discover"):
+        if config.input_.src_path.is_dir():
+            status = console.status("Searching for cue files\n")
+            status.start()
+            sheets = SoxcueSheets(config=config)
+            status.stop()
+        else:
+            sheets = SoxcueSheets(config=config)
+    cue_sheets = sheets.cue_sheets
+
+    if parsed.cgroup:
+        # workers and SoX processes inherit it
+        join_cgroup(
+            parsed.cgroup,
+            cpu_weight=parsed.cgroup_cpu_weight,
+            memory_max=parsed.cgroup_memory_max,
+        )
+
+    # one bad CUE sheet doesn't stop the run
+    for cue_path, exc in sheets.failed.items():
+        console.print(f"[red]'{cue_path}': {exc}")
+    failures = len(sheets.failed)
+    stream = TarStream(sys.stdout.buffer) if parsed.tar else None
+    with SoxcueEngine(
+        prefetch_budget=parsed.prefetch * 1024 * 1024,
+        stream=stream,
+        max_sheets=max(parsed.sheets, 1),
+    ) as engine, profile(parsed.profile, "process"):
+        engines.append(engine)
+        process = SoxcueProcess(cue_sheets=cue_sheets, config=config, engine=engine)
+        for _, exc in process.run():
+            if exc is None:
+                continue
+            if not isinstance(exc, SoxcueEngineError):
+                raise exc
+            console.print(f"[red]{exc}")
+            failures += 1
+    if stream:
+        stream.close()
+        scratch.cleanup()
 
-    for cue_sheet in cue_sheets:
-        SoxcueProcess(cue_sheet=cue_sheet, config=config)
+    if failures:
+        raise SoxcueError(f"{failures} CUE sheet(s) failed\n")
 
 
 if __name__ == "__main__":
@@ -5,9 +5,13 @@ soxcue config
 
 import re
 from dataclasses import dataclass, field
+from functools import cache
 from pathlib import Path
 from subprocess import CalledProcessError, run
 
+# formats the simulated backend reads/writes, used without SoX
+SIM_FORMATS = ["flac", "mp3", "wav"]
+
 
 class SoxcueConfigError(Exception):
     """soxcue configuration error"""
@@ -19,7 +23,8 @@ class SoxProperties:
     SoX properties
     """
 
-    exe_name: str
+    # None: no SoX (simulated backend)
+    exe_name: str | None
     comp_level: float | None
     supported_formats: list = field(init=False)
 
@@ -27,13 +32,25 @@ class SoxProperties:
         """
         Collect audio file formats supported by SoX
         """
+        self.supported_formats = (
+            list(self.get_supported_formats(self.exe_name))
+            if self.exe_name
+            else SIM_FORMATS
+        )
+
+    @staticmethod
+    @cache
+    def get_supported_formats(exe_name: str) -> list:
+        """
+        Probe SoX once per process
+        """
         formats_str = "AUDIO FILE FORMATS: "
         try:
-            self.supported_formats = (
+            return (
                 [
                     x
                     for x in run(
-                        f"{self.exe_name} -h",
+                        f"{exe_name} -h",
                         shell=True,
                         check=True,
                         capture_output=True,
@@ -45,7 +62,7 @@ class SoxProperties:
                 .split(" ")
             )
         except CalledProcessError as exc:
-            raise SoxcueConfigError(f"{self.exe_name} is not installed") from exc
+            raise SoxcueConfigError(f"{exe_name} is not installed") from exc
 
 
 @dataclass
@@ -55,6 +72,92 @@ class ConfigInput:
     """
 
     src_path: Path
+    # CUE sheet path globs, relative to src_path
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=list)
+    max_depth: int | None = None
+    # search inside archives found below src_path
+    archives: bool = False
+
+
+@dataclass
+class OutputTarget:
+    """
+    Additional output format
+    Unset options default to the main output ones
+    """
+
+    enc_format: str
+    comp_level: float | None = None
+    naming_spec: str | None = None
+    dst_dir: Path | None = None
+    # sample rate/bits, None keeps the source ones
+    rate: int | None = None
+    bits: int | None = None
+    # unset options default to the preset ones
+    rate_quality: str | None = None
+    dither: bool | None = None
+
+
+@dataclass(frozen=True)
+class Preset:
+    """
+    SoX settings trading quality for speed
+    """
+
+    name: str
+    # SoX rate effect quality: q(uick), l(ow), m(edium), h(igh), v(ery high)
+    rate_quality: str = "h"
+    # dither when reducing bit depth
+    dither: bool = True
+    # SoX --buffer bytes, None is SoX default
+    buffer: int | None = None
+    multi_threaded: bool = False
+    # {output format: compression level}, others get SoX default
+    comp_levels: dict[str, float] = field(default_factory=dict)
+
+
+PRESETS = {
+    preset.name: preset
+    for preset in [
+        Preset(
+            name="fast",
+            rate_quality="l",
+            dither=False,
+            buffer=131072,
+            comp_levels={"flac": 0},
+        ),
+        Preset(name="balanced"),
+        Preset(
+            name="archival",
+            rate_quality="v",
+            # very high quality rate effect is the costly one, channels in parallel
+            multi_threaded=True,
+            comp_levels={"flac": 8},
+        ),
+    ]
+}
+
+
+@dataclass(frozen=True)
+class SimCost:
+    """
+    Simulated backend job cost model:
+    fixed + per_second * track seconds, +/- jitter fraction
+    Deterministic for a seed and output path, except hangs (a retry may go through)
+    """
+
+    fixed: float = 0.01
+    per_second: float = 0.001
+    jitter: float = 0.2
+    # fraction of jobs failing
+    failure_rate: float = 0.0
+    # fraction of jobs taking slow_factor times longer
+    slow_rate: float = 0.0
+    slow_factor: float = 10.0
+    # fraction of job runs hanging until the timeout kills them
+    hang_rate: float = 0.0
+    seed: int = 0
 
 
 @dataclass
@@ -66,6 +169,16 @@ class ConfigOutput:
     dst_dir: Path | None
     cmd_comment: str | None
     enc_format: str
+    replaygain: bool = False
+    checksums: bool = False
+    targets: list[OutputTarget] = field(default_factory=list)
+    store_dir: Path | None = None
+    # main output rate/bits/quality/dither options
+    main_target: OutputTarget | None = None
+    # re-encode outputs even if only their tags/names changed
+    force: bool = False
+    # outputs streamed as tar to stdout, dst_dir is a scratch directory
+    tar: bool = False
 
     def get_comments_dict(self) -> dict:
         """
@@ -89,6 +202,23 @@ class ConfigRuntime:
     time_wait: int
     naming_spec: str
     sox: SoxProperties
+    # {path on a device or "" for any device: value}
+    device_jobs: dict[str, int] = field(default_factory=dict)
+    bandwidth: dict[str, float] = field(default_factory=dict)
+    preset: Preset = PRESETS["balanced"]
+    # "auto" picks the fastest installed decoder/encoder per format pair
+    backend: str = "auto"
+    # job timeout: timeout + timeout_factor * track length seconds, 0 is off
+    timeout: float = 60.0
+    timeout_factor: float = 2.0
+    retries: int = 2
+    resume: bool = False
+    profile_dir: Path | None = None
+    # low CPU/IO priority jobs, throttled above pressure_threshold PSI %
+    background: bool = False
+    pressure_threshold: float = 10.0
+    # "sim" backend cost model
+    sim_cost: SimCost = SimCost()
 
 
 @dataclass
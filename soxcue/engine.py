@@ -0,0 +1,1063 @@
+"""
+soxcue engine
+Library API, no terminal dependencies
+"""
+
+import hashlib
+import json
+import os
+import signal
+import time
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from subprocess import CalledProcessError, Popen, DEVNULL, PIPE
+from threading import Lock, RLock, Thread, Timer
+from typing import Callable
+from multiprocessing import active_children
+from mediafile import UnreadableFileError
+from mutagen import File, MutagenError
+from soxcue.archive import (
+    SoxcueArchiveError,
+    get_real_path,
+    probe,
+    source_size,
+    source_stat,
+)
+from soxcue.background import (
+    PressureThrottle,
+    background_call,
+    get_run_delay,
+    is_background,
+    set_background,
+)
+from soxcue.checksums import CHECKSUMS, PcmChecksums
+from soxcue.config import Config, OutputTarget
+from soxcue.journal import Journal
+from soxcue.loudness import LoudnessMeter
+from soxcue.manifest import Manifest
+from soxcue.parser import TrackProperties
+from soxcue.prefetch import Prefetcher
+from soxcue.profiling import profile_call
+from soxcue.schedule import DeviceScheduler, ScheduledJob
+from soxcue.sheets import LOSSLESS_FORMATS, SoxcueSheet, SoxcueSheets
+from soxcue.simulate import simulate_process
+from soxcue.store import ContentStore, clone_file
+from soxcue.stream import TarStream
+from soxcue.tagging import Tags
+
+# seconds, doubled on every retry
+RETRY_BACKOFF = 1.0
+
+# job processes running in this worker
+RUNNING: set[Popen] = set()
+
+# errors failing a single track (unreadable source, tagging), others go on
+TRACK_ERRORS = (OSError, MutagenError, UnreadableFileError, SoxcueArchiveError)
+
+# progress(cue_sheet, track, status)
+ProgressCallback = Callable[[SoxcueSheet, TrackProperties, str], None]
+
+
+class SoxcueEngineError(Exception):
+    """soxcue engine error"""
+
+
+class SoxcueTimeoutError(SoxcueEngineError):
+    """soxcue job timeout"""
+
+
+def init_worker() -> None:
+    """
+    Worker process: kill running SoX process groups when terminated/interrupted
+    """
+
+    def terminate(signum, frame) -> None:
+        # pylint: disable=unused-argument
+        for proc in list(RUNNING):
+            Watchdog.kill_group(proc)
+        os._exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+
+
+class Watchdog:
+    """
+    Kill job processes once the job runs longer than timeout seconds
+    No timeout if None
+    Background job: processes at idle priority,
+    time spent waiting for a CPU doesn't count
+    """
+
+    def __init__(self, timeout: float | None):
+        self.timeout = timeout
+        self.procs: list[Popen] = []
+        self.fired = False
+        self.exited = False
+        self.lock = Lock()
+        self.timer = Timer(timeout, self._kill) if timeout else None
+        self.background = is_background()
+        # run queue wait already granted
+        self.run_delay = 0.0
+
+    def __enter__(self) -> "Watchdog":
+        if self.timer:
+            self.timer.start()
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        with self.lock:
+            self.exited = True
+            if self.timer:
+                self.timer.cancel()
+        RUNNING.difference_update(self.procs)
+        if self.fired:
+            raise SoxcueTimeoutError(f"Job timed out after {self.timeout:.0f}s")
+
+    def popen(self, cmd: str, **kwargs) -> Popen:
+        """
+        Start a watched shell command in its own process group
+        """
+        proc = Popen(
+            cmd,
+            shell=True,
+            process_group=0,
+            preexec_fn=set_background if self.background else None,
+            **kwargs,
+        )
+        RUNNING.add(proc)
+        with self.lock:
+            self.procs.append(proc)
+            if self.fired:
+                self.kill_group(proc)
+        return proc
+
+    def _kill(self) -> None:
+        with self.lock:
+            if self.exited:
+                return
+            if self.background:
+                # starved by other processes, not stuck: extend by the wait
+                delay = get_run_delay({proc.pid for proc in self.procs})
+                if delay - self.run_delay >= 1:
+                    self.timer = Timer(delay - self.run_delay, self._kill)
+                    self.timer.start()
+                    self.run_delay = delay
+                    return
+            self.fired = True
+            for proc in self.procs:
+                self.kill_group(proc)
+
+    @staticmethod
+    def kill_group(proc: Popen) -> None:
+        """
+        Kill the shell and everything it started
+        """
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+@dataclass
+class SheetJob:
+    """
+    Submitted CUE sheet
+    future resolves to the SoxcueSheet once all its tracks are done
+    tracks futures resolve to TrackProperties (with levels/checksums if requested)
+    """
+
+    cue_sheet: SoxcueSheet
+    future: Future = field(default_factory=Future)
+    tracks: dict[str, Future] = field(default_factory=dict)
+
+
+class SoxcueEngine:
+    """
+    Persistent worker pool and caches
+    reused by any number of process_sheet()/submit() calls
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        prefetch_budget: int = 0,
+        stream: TarStream | None = None,
+        max_sheets: int = 1,
+    ):
+        """
+        prefetch_budget: bytes of upcoming sheets sources to read ahead
+        stream: done tracks outputs are moved into it
+        max_sheets: CUE sheets processed at once, sharing the workers
+        """
+        self.max_workers = max_workers if max_workers else max(os.cpu_count() - 1, 1)
+        self.executor = ProcessPoolExecutor(self.max_workers, initializer=init_worker)
+        self.prefetcher = Prefetcher(prefetch_budget) if prefetch_budget else None
+        self.stream = stream
+        self.throttle: PressureThrottle | None = None
+        # CUE sheets processed at once, their tracks in parallel
+        # jobs of earlier sheets are started first
+        self.max_sheets = max_sheets
+        self.sheets_executor = ThreadPoolExecutor(max_workers=max_sheets)
+        # shared by concurrent sheets, by (device_jobs, bandwidth, background)
+        self.schedulers: dict[tuple, DeviceScheduler] = {}
+        self.lengths: dict[tuple, float] = {}
+        self.stores: dict[Path, ContentStore] = {}
+        # journals of sheets being processed
+        self.journals: set[Journal] = set()
+        # re-entrant: abort() runs in signal handlers, interrupting its holder
+        self.lock = RLock()
+
+    def __enter__(self) -> "SoxcueEngine":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Shutdown worker pools
+        """
+        self.sheets_executor.shutdown(wait=wait, cancel_futures=not wait)
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self.prefetcher:
+            self.prefetcher.close()
+
+    def abort(self) -> None:
+        """
+        Kill running jobs and remove partial outputs, fast:
+        meant for signal handlers, the engine is unusable afterwards
+        Complete (encoded) outputs are kept for a resumed run
+        """
+        # workers kill their SoX process groups on SIGTERM
+        for process in active_children():
+            process.terminate()
+        with self.lock:
+            journals = list(self.journals)
+        for journal in journals:
+            journal.discard_partial(keep_encoded=True)
+
+    def prefetch(self, cue_sheet: SoxcueSheet, config: Config | None = None) -> None:
+        """
+        Read ahead sheet sources while the current sheet is processed
+        config: reads are limited like its jobs (device slots, bandwidth)
+        """
+        if self.prefetcher:
+            with self.lock:
+                scheduler = self.get_scheduler(config) if config else None
+            self.prefetcher.prefetch(self.get_real_paths(cue_sheet), scheduler)
+
+    def get_length(self, src_path: Path) -> float:
+        """
+        Source file length in seconds
+        Cached while the file is unchanged
+        """
+        stat = source_stat(src_path)
+        key = (src_path, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if key not in self.lengths:
+                if (audio := probe(src_path)) is None:
+                    raise SoxcueEngineError(f"Couldn't read length of '{src_path}'")
+                self.lengths[key] = audio.info.length
+            return self.lengths[key]
+
+    @staticmethod
+    def get_real_paths(cue_sheet: SoxcueSheet) -> list[Path]:
+        """
+        Source files of a sheet, archives for archived sources
+        """
+        return list(dict.fromkeys(get_real_path(x.src_path) for x in cue_sheet.tracks))
+
+    def get_track_length(self, track: TrackProperties) -> float:
+        """
+        Track length in seconds
+        """
+        return (
+            track.end if track.end != 0 else self.get_length(track.src_path)
+        ) - track.start
+
+    def submit(
+        self,
+        config: Config,
+        src_path: Path | None = None,
+        progress: ProgressCallback | None = None,
+    ) -> list[SheetJob]:
+        """
+        Find and plan CUE sheets in src_path (default: config src_path)
+        Queue them for processing
+        Sheets that couldn't be planned come first, their future failed
+        """
+        if src_path:
+            config = replace(
+                config, input_=replace(config.input_, src_path=Path(src_path))
+            )
+
+        sheets = SoxcueSheets(config=config)
+        sheet_jobs = []
+        for cue_path, exc in sheets.failed.items():
+            # couldn't be planned, no tracks
+            sheet_job = SheetJob(
+                cue_sheet=SoxcueSheet(
+                    metadata=None, tracks=[], cue_path=cue_path, cover_path=None
+                )
+            )
+            sheet_job.future.set_exception(exc)
+            sheet_jobs.append(sheet_job)
+        return sheet_jobs + self.submit_sheets(sheets.cue_sheets, config, progress)
+
+    def submit_sheets(
+        self,
+        cue_sheets: list[SoxcueSheet],
+        config: Config,
+        progress: ProgressCallback | None = None,
+    ) -> list[SheetJob]:
+        """
+        Queue planned CUE sheets for processing
+        """
+        sheet_jobs = []
+        for idx, cue_sheet in enumerate(cue_sheets):
+            sheet_job = SheetJob(cue_sheet=cue_sheet)
+            sheet_job.tracks = {track.index: Future() for track in cue_sheet.tracks}
+            self.sheets_executor.submit(
+                self._run_sheet_job,
+                sheet_job,
+                config,
+                progress,
+                # starts once this one is done
+                (
+                    cue_sheets[idx + self.max_sheets]
+                    if idx + self.max_sheets < len(cue_sheets)
+                    else None
+                ),
+            )
+            sheet_jobs.append(sheet_job)
+
+        return sheet_jobs
+
+    def _run_sheet_job(
+        self,
+        sheet_job: SheetJob,
+        config: Config,
+        progress: ProgressCallback | None,
+        next_sheet: SoxcueSheet | None = None,
+    ) -> None:
+        """
+        Process sheet, resolve its futures
+        Read ahead the next sheet sources meanwhile
+        """
+
+        def on_progress(cue_sheet, track, status) -> None:
+            if status == "done":
+                sheet_job.tracks[track.index].set_result(track)
+            if progress:
+                progress(cue_sheet, track, status)
+
+        if not sheet_job.future.set_running_or_notify_cancel():
+            for future in sheet_job.tracks.values():
+                future.cancel()
+            return
+
+        if next_sheet:
+            self.prefetch(next_sheet, config)
+
+        try:
+            self.process_sheet(sheet_job.cue_sheet, config, progress=on_progress)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            for future in sheet_job.tracks.values():
+                if not future.done():
+                    future.set_exception(exc)
+            sheet_job.future.set_exception(exc)
+        else:
+            sheet_job.future.set_result(sheet_job.cue_sheet)
+
+    def get_scheduler(self, config: Config) -> DeviceScheduler:
+        """
+        Scheduler shared by the sheets processed with the same settings
+        """
+        if config.runtime_.background and not self.throttle:
+            # kept across sheets
+            self.throttle = PressureThrottle(config.runtime_.pressure_threshold)
+        key = (
+            tuple(sorted((config.runtime_.device_jobs or {}).items())),
+            tuple(sorted((config.runtime_.bandwidth or {}).items())),
+            config.runtime_.background,
+        )
+        if key not in self.schedulers:
+            self.schedulers[key] = DeviceScheduler(
+                max_jobs=self.max_workers,
+                device_jobs=config.runtime_.device_jobs,
+                bandwidth=config.runtime_.bandwidth,
+                throttle=self.throttle if config.runtime_.background else None,
+            )
+        return self.schedulers[key]
+
+    def process_sheet(
+        self,
+        cue_sheet: SoxcueSheet,
+        config: Config,
+        progress: ProgressCallback | None = None,
+    ) -> SoxcueSheet:
+        """
+        Run splitting jobs, tag tracks
+        Block until all tracks are done
+        """
+
+        def set_status(track: TrackProperties, status: str) -> None:
+            if status == "done" and self.stream:
+                self.stream.add(
+                    [(output.dst_path, output.dst_root) for output in track.outputs]
+                )
+            if progress:
+                progress(cue_sheet, track, status)
+
+        try:
+            tagger = Tags(cue_sheet=cue_sheet, config=config)
+            for output in cue_sheet.tracks[0].outputs:
+                output.dst_path.parent.mkdir(parents=True, exist_ok=True)
+        except TRACK_ERRORS as exc:
+            raise SoxcueEngineError(
+                f"Couldn't prepare '{cue_sheet.cue_path}': {exc}"
+            ) from exc
+        if self.prefetcher:
+            # in use, never evicted by the next sheet read-ahead
+            self.prefetcher.pin(self.get_real_paths(cue_sheet))
+        with self.lock:
+            scheduler = self.get_scheduler(config)
+            # replaced once broken, by whichever sheet notices first
+            executor = self.executor
+        tracks = {track.index: track for track in cue_sheet.tracks}
+        manifests = {
+            output.dst_root: Manifest.for_sheet(output.dst_root, cue_sheet.cue_path)
+            for output in cue_sheet.tracks[0].outputs
+        }
+
+        # write-ahead journal next to the main output manifest
+        journal = Journal(manifests[cue_sheet.dst_root].path.with_suffix(".journal"))
+        # outputs of an interrupted run, complete ones are kept if resuming
+        journal.load()
+        journal.discard_partial(keep_encoded=config.runtime_.resume)
+        resumed = {
+            key: record
+            for key, record in journal.tracks.items()
+            if config.runtime_.resume
+            and key in tracks
+            and record["state"] in ("encoded", "tagged")
+            and record["paths"] == [str(x.dst_path) for x in tracks[key].outputs]
+            and all(Path(path).is_file() for path in record["paths"])
+        }
+        journal.remove()
+        with self.lock:
+            self.journals.add(journal)
+
+        levels = {}
+        finished = set()
+        failed: dict[str, BaseException] = {}
+
+        def fail(track: TrackProperties, exc: BaseException, remove: bool) -> None:
+            """
+            Other tracks go on, partial outputs go away
+            """
+            failed[track.index] = exc
+            if remove:
+                for output in track.outputs:
+                    output.dst_path.unlink(missing_ok=True)
+            set_status(track, "failed")
+
+        # outputs of earlier runs with unchanged audio are only retagged/renamed
+        tracks_tags = {}
+        records: dict[str, list[dict]] = {}
+        produced: dict[str, list[tuple[Manifest, str]]] = {}
+        jobs = []
+        for track in cue_sheet.tracks:
+            try:
+                tracks_tags[track.index] = tagger.get_track_tags(track=track)
+                tags_key = tagger.get_tags_key(tracks_tags[track.index]["tags"])
+                records[track.index] = [
+                    {
+                        "track": track.index,
+                        "audio_key": self.get_audio_key(track, output.target),
+                        "tags_key": tags_key,
+                    }
+                    for output in track.outputs
+                ]
+                if not config.output_.force and (
+                    previous := self.find_produced(
+                        track, records[track.index], manifests, config
+                    )
+                ):
+                    produced[track.index] = previous
+                elif track.index not in resumed:
+                    jobs.append(self.get_job(track, config, scheduler))
+            except (SoxcueEngineError, *TRACK_ERRORS) as exc:
+                fail(track, exc, remove=resumed.pop(track.index, None) is not None)
+        for job in jobs:
+            journal.set_state(
+                job.key,
+                "planned",
+                paths=[str(output.dst_path) for output in tracks[job.key].outputs],
+            )
+
+        def finish(track: TrackProperties, result: dict, fresh: bool = True) -> None:
+            """
+            Tag outputs, record them in the manifests
+            fresh: outputs produced by this run, journaled
+            """
+            track_tags = tracks_tags[track.index]
+            if config.output_.replaygain:
+                track.levels = levels[track.index] = result["levels"]
+                track_tags["tags"].update(tagger.get_gain_tags([track.levels]))
+            if config.output_.checksums:
+                track.checksums = result["checksums"]
+            if fresh:
+                tagger.write_tags(track_tags)
+                journal.set_state(track.index, "tagged")
+
+            for output, record in zip(track.outputs, records[track.index]):
+                if config.output_.replaygain:
+                    record["levels"] = track.levels
+                # lossless outputs checksums match the decoded PCM ones
+                if config.output_.checksums and self.keeps_pcm(output.target):
+                    record.update(
+                        pcm=track.pcm, accuraterip=track.accuraterip, **track.checksums
+                    )
+                manifests[output.dst_root].set_record(output.dst_path, record)
+            for manifest in manifests.values():
+                manifest.save()
+            if fresh:
+                journal.set_state(track.index, "published")
+            finished.add(track.index)
+            set_status(track, "album gain" if config.output_.replaygain else "done")
+
+        def try_finish(
+            track: TrackProperties, result: dict, fresh: bool = True
+        ) -> None:
+            """
+            A track failing to tag fails alone, its fresh outputs go away
+            """
+            try:
+                finish(track, result, fresh=fresh)
+            except TRACK_ERRORS as exc:
+                fail(track, exc, remove=fresh)
+
+        # unchanged audio: rename outputs if their names changed, retag them
+        retags = {}
+        for key, previous in produced.items():
+            moves = [
+                (manifest.get_path(record_key), output.dst_path)
+                for (manifest, record_key), output in zip(previous, tracks[key].outputs)
+            ]
+            old_record = previous[0][0].records[previous[0][1]]
+            if all(old_path == new_path for old_path, new_path in moves) and (
+                old_record["tags_key"] == records[key][0]["tags_key"]
+            ):
+                try_finish(
+                    tracks[key], self.get_produced_result(old_record), fresh=False
+                )
+                continue
+
+            for manifest, record_key in previous:
+                manifest.records.pop(record_key)
+            retags[key] = (moves, old_record)
+        self.move_outputs([move for moves, _ in retags.values() for move in moves])
+
+        # tagging is I/O bound
+        with ThreadPoolExecutor() as retagger:
+            futures = {}
+            for key, (_, old_record) in retags.items():
+                set_status(tracks[key], "retagging")
+                if config.output_.replaygain:
+                    tracks_tags[key]["tags"].update(
+                        tagger.get_gain_tags([old_record["levels"]])
+                    )
+                futures[retagger.submit(tagger.write_tags, tracks_tags[key])] = key
+            for future in as_completed(futures):
+                key = futures[future]
+                if future.exception():
+                    fail(tracks[key], future.exception(), remove=False)
+                    continue
+                try_finish(
+                    tracks[key],
+                    self.get_produced_result(retags[key][1]),
+                    fresh=False,
+                )
+
+        def on_start(job: ScheduledJob) -> None:
+            journal.set_state(job.key, "encoding")
+            set_status(tracks[job.key], "sox")
+
+        try:
+            # encoded by an interrupted run
+            for key, record in resumed.items():
+                journal.set_state(
+                    key, "encoded", paths=record["paths"], result=record["result"]
+                )
+                try_finish(tracks[key], record["result"])
+
+            for job in scheduler.run(executor, jobs, on_start=on_start):
+                track = tracks[job.key]
+                if job.future.exception():
+                    fail(track, job.future.exception(), remove=True)
+                    continue
+
+                set_status(track, "tagging")
+                journal.set_state(job.key, "encoded", result=job.future.result())
+                try_finish(track, job.future.result())
+        except BrokenProcessPool as exc:
+            # no more jobs can be submitted
+            for key, track in tracks.items():
+                if key not in finished and key not in failed:
+                    failed[key] = exc
+                    set_status(track, "failed")
+        finally:
+            if self.prefetcher:
+                self.prefetcher.release(self.get_real_paths(cue_sheet))
+            with self.lock:
+                self.journals.discard(journal)
+            journal.close()
+
+        if any(isinstance(exc, BrokenProcessPool) for exc in failed.values()):
+            # a worker died, the pool is unusable for later sheets
+            with self.lock:
+                if self.executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = ProcessPoolExecutor(
+                        self.max_workers, initializer=init_worker
+                    )
+                    # slots counts of the broken pool jobs start over
+                    self.schedulers.clear()
+
+        if config.output_.replaygain and (jobs or retags or resumed) and not failed:
+            # album gain once all tracks are measured
+            album_tags = tagger.get_gain_tags(list(levels.values()), album=True)
+            for track in cue_sheet.tracks:
+                try:
+                    tagger.write_tags(
+                        {
+                            "tags": album_tags,
+                            "paths": [output.dst_path for output in track.outputs],
+                        }
+                    )
+                except TRACK_ERRORS as exc:
+                    fail(track, exc, remove=False)
+                    continue
+                set_status(track, "done")
+        elif config.output_.replaygain:
+            for key in finished:
+                set_status(tracks[key], "done")
+
+        # sheet done, failed tracks outputs are removed: nothing to recover
+        journal.remove()
+        if failed:
+            raise SoxcueEngineError(
+                f"{len(failed)} of {len(tracks)} track(s) failed in "
+                f"'{cue_sheet.cue_path}': "
+                + "; ".join(f"{key}: {exc}" for key, exc in failed.items())
+            )
+        return cue_sheet
+
+    def get_audio_key(self, track: TrackProperties, target: OutputTarget) -> str:
+        """
+        Everything an output audio depends on
+        Source file identified by its path, size and mtime
+        """
+        stat = source_stat(track.src_path)
+        return hashlib.sha1(
+            json.dumps(
+                [
+                    str(track.src_path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    track.start,
+                    track.end,
+                    target.enc_format,
+                    target.comp_level,
+                    target.rate,
+                    target.bits,
+                    target.rate_quality,
+                    target.dither,
+                ]
+            ).encode()
+        ).hexdigest()
+
+    def find_produced(
+        self,
+        track: TrackProperties,
+        records: list[dict],
+        manifests: dict[Path, Manifest],
+        config: Config,
+    ) -> list[tuple[Manifest, str]] | None:
+        """
+        Existing outputs (manifest, record key) with the same audio
+        None unless all track outputs exist with everything requested recorded
+        """
+        previous = []
+        for output, record in zip(track.outputs, records):
+            manifest = manifests[output.dst_root]
+            found = [
+                k
+                for k, v in manifest.records.items()
+                if v.get("audio_key") == record["audio_key"]
+            ]
+            if not found or not manifest.get_path(found[0]).is_file():
+                return None
+            old_record = manifest.records[found[0]]
+            if config.output_.replaygain and "loudness" not in old_record.get(
+                "levels", {}
+            ):
+                return None
+            if (
+                config.output_.checksums
+                and self.keeps_pcm(output.target)
+                and "md5" not in old_record
+            ):
+                return None
+            previous.append((manifest, found[0]))
+        return previous
+
+    @staticmethod
+    def get_produced_result(record: dict) -> dict:
+        """
+        Job result of an output produced earlier
+        """
+        result = {"checksums": {k: record[k] for k in CHECKSUMS if k in record}}
+        if "levels" in record:
+            result["levels"] = record["levels"]
+        return result
+
+    @staticmethod
+    def move_outputs(moves: list[tuple[Path, Path]]) -> None:
+        """
+        Rename outputs, through temporary names:
+        a new name may be another output old name
+        """
+        moves = [(old, new, new.with_name(f".{new.name}.move")) for old, new in moves]
+        for old_path, new_path, tmp_path in moves:
+            if old_path != new_path:
+                new_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(old_path, tmp_path)
+        for old_path, new_path, tmp_path in moves:
+            if old_path != new_path:
+                os.replace(tmp_path, new_path)
+                try:
+                    # naming spec directory changed
+                    old_path.parent.rmdir()
+                except OSError:
+                    pass
+
+    @staticmethod
+    def keeps_pcm(target: OutputTarget) -> bool:
+        """
+        Output decodes to the source PCM (its checksums match)
+        """
+        return target.enc_format in LOSSLESS_FORMATS and not (
+            target.rate or target.bits
+        )
+
+    def get_job(
+        self, track: TrackProperties, config: Config, scheduler: DeviceScheduler
+    ) -> ScheduledJob:
+        """
+        Scheduled track job
+        worker function wrapped by retries, then by the content store,
+        then by background priority, then by the profiler
+        """
+        func, args = self.get_job_args(track, config)
+        if config.runtime_.retries:
+            func, args = self._retry_process, (config.runtime_.retries, func, args)
+        if config.output_.store_dir:
+            func, args = self._store_process, (
+                self.get_store_objects(track, config),
+                [
+                    k
+                    for k, v in [
+                        ("levels", config.output_.replaygain),
+                        ("checksums", config.output_.checksums),
+                    ]
+                    if v
+                ],
+                func,
+                args,
+            )
+        if config.runtime_.background:
+            func, args = background_call, (func, args)
+        if config.runtime_.profile_dir:
+            func, args = profile_call, (config.runtime_.profile_dir, "job", func, args)
+
+        read_device = scheduler.get_device(track.src_path)
+        return ScheduledJob(
+            key=track.index,
+            func=func,
+            args=args,
+            devices=frozenset(
+                [read_device]
+                + [
+                    scheduler.get_device(output.dst_path.parent)
+                    for output in track.outputs
+                ]
+            ),
+            read_device=read_device,
+            nbytes=int(
+                source_size(track.src_path)
+                * self.get_track_length(track)
+                / (self.get_length(track.src_path) or 1)
+            ),
+        )
+
+    def get_job_args(
+        self, track: TrackProperties, config: Config
+    ) -> tuple[Callable, tuple]:
+        """
+        Worker function and its args for a track
+        Timeout scales with the track length
+        """
+        timeout = (
+            config.runtime_.timeout
+            + config.runtime_.timeout_factor * self.get_track_length(track)
+            if config.runtime_.timeout
+            else None
+        )
+        if track.sox_cmd:
+            func, args = SoxcueEngine._sox_process, (track.sox_cmd, timeout)
+        elif track.decode_cmd:
+            func, args = SoxcueEngine._pcm_process, (
+                track.decode_cmd,
+                [output.encode_cmd for output in track.outputs if output.encode_cmd],
+                track.pcm,
+                track.accuraterip,
+                track.meter_cmd,
+                config.output_.checksums,
+                timeout,
+            )
+        elif track.backends["decoder"] == "sim":
+            func, args = simulate_process, (
+                config.runtime_.sim_cost,
+                self.get_track_length(track),
+                [output.dst_path for output in track.outputs],
+                config.output_.replaygain,
+                config.output_.checksums,
+                timeout,
+            )
+        else:
+            func, args = None, ()
+
+        if copies := [
+            (track.src_path, output.dst_path) for output in track.outputs if output.copy
+        ]:
+            return SoxcueEngine._copy_process, (copies, func, args)
+        return func, args
+
+    def get_store_objects(
+        self, track: TrackProperties, config: Config
+    ) -> list[tuple[Path, Path]]:
+        """
+        (store object path, output path) for every track output
+        """
+        with self.lock:
+            if config.output_.store_dir not in self.stores:
+                self.stores[config.output_.store_dir] = ContentStore(
+                    config.output_.store_dir
+                )
+            store = self.stores[config.output_.store_dir]
+
+        source_hash = store.get_source_hash(track.src_path)
+        return [
+            (
+                store.get_object_path(
+                    source_hash,
+                    {
+                        "start": track.start,
+                        "end": track.end,
+                        "enc_format": output.target.enc_format,
+                        "comp_level": output.target.comp_level,
+                        "rate": output.target.rate,
+                        "bits": output.target.bits,
+                        "rate_quality": output.target.rate_quality,
+                        "dither": output.target.dither,
+                    },
+                ),
+                output.dst_path,
+            )
+            for output in track.outputs
+        ]
+
+    @staticmethod
+    def _retry_process(retries: int, func: Callable, args: tuple) -> dict:
+        """
+        Run the job, retry failed/timed out runs with exponential backoff
+        """
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except (CalledProcessError, SoxcueTimeoutError, OSError):
+                if attempt == retries:
+                    raise
+                time.sleep(RETRY_BACKOFF * 2**attempt)
+                attempt += 1
+
+    @staticmethod
+    def _store_process(
+        objects: list[tuple[Path, Path]],
+        required: list[str],
+        func: Callable,
+        args: tuple,
+    ) -> dict:
+        """
+        Reuse stored outputs if all of them are stored
+        Otherwise run the job and store its outputs
+        """
+        results = [ContentStore.get_result(object_path) for object_path, _ in objects]
+        if all(
+            result is not None and all(k in result for k in required)
+            # stored before levels had BS.1770 loudness
+            and ("levels" not in required or "loudness" in result["levels"])
+            for result in results
+        ):
+            for object_path, dst_path in objects:
+                clone_file(object_path, dst_path)
+            return results[0]
+
+        result = func(*args)
+        for object_path, dst_path in objects:
+            ContentStore.put(object_path, dst_path, result)
+        return result
+
+    @staticmethod
+    def _copy_process(
+        copies: list[tuple[Path, Path]], func: Callable | None, args: tuple
+    ) -> dict:
+        """
+        Copy (reflink where supported) source files without their tags
+        Then run the decode job, if any
+        """
+        for src_path, dst_path in copies:
+            clone_file(src_path, dst_path)
+            audio = File(dst_path)
+            if audio is not None:
+                if hasattr(audio, "clear_pictures"):
+                    audio.clear_pictures()
+                audio.delete()
+        return func(*args) if func else {}
+
+    @staticmethod
+    def _get_levels(sox_stats: list[str]) -> dict[str, float]:
+        """
+        Track levels reported by SoX stats effect
+        """
+
+        def stat(name: str) -> float:
+            # first value is the overall (all channels) one
+            return float(
+                [x for x in sox_stats if x.startswith(name)][0][len(name) :].split()[0]
+            )
+
+        return {"peak": stat("Pk lev dB"), "length": stat("Length s")}
+
+    @staticmethod
+    def _sox_process(sox_cmd: str, timeout: float | None = None) -> dict:
+        """
+        Execute SoX process
+        Nothing reaches stdout: it may be the --tar stream
+        """
+        with Watchdog(timeout) as watchdog:
+            proc = watchdog.popen(sox_cmd, stdout=DEVNULL, stderr=PIPE, text=True)
+            _, stderr = proc.communicate()
+        if proc.returncode:
+            raise CalledProcessError(proc.returncode, sox_cmd, stderr=stderr)
+        return {}
+
+    @staticmethod
+    def _pcm_process(
+        decode_cmd: str,
+        encode_cmds: list[str],
+        pcm: dict[str, int],
+        accuraterip: tuple[bool, bool] | None,
+        meter_cmd: str | None = None,
+        checksums: bool = False,
+        timeout: float | None = None,
+    ) -> dict:
+        """
+        Pipe raw PCM from SoX decoder to all SoX encoders
+        Checksum PCM on the way if requested
+        meter_cmd: K-weighting SoX process, levels with BS.1770 loudness
+        (the decoder runs SoX stats effect for the peak)
+        """
+        pcm_checksums = PcmChecksums(accuraterip=accuraterip) if checksums else None
+        meter = LoudnessMeter(pcm["rate"], pcm["channels"]) if meter_cmd else None
+        with Watchdog(timeout) as watchdog:
+            decoder = watchdog.popen(decode_cmd, stdout=PIPE, stderr=PIPE)
+            encoders = [
+                watchdog.popen(encode_cmd, stdin=PIPE, stdout=DEVNULL)
+                for encode_cmd in encode_cmds
+            ]
+            if meter:
+                # fed like an encoder, its K-weighted output read concurrently
+                meter_proc = watchdog.popen(meter_cmd, stdin=PIPE, stdout=PIPE)
+                encoders.append(meter_proc)
+                encode_cmds = [*encode_cmds, meter_cmd]
+
+                def read_meter() -> None:
+                    while chunk := meter_proc.stdout.read(1 << 20):
+                        meter.update(chunk)
+
+                meter_reader = Thread(target=read_meter)
+                meter_reader.start()
+
+            # drain decoder stderr (stats/errors) so it never blocks the pipe
+            decoder_stderr = []
+            stderr_reader = Thread(
+                target=lambda: decoder_stderr.append(decoder.stderr.read().decode())
+            )
+            stderr_reader.start()
+
+            try:
+                while chunk := decoder.stdout.read(1 << 20):
+                    if pcm_checksums:
+                        pcm_checksums.update(chunk)
+                    for encoder in encoders:
+                        encoder.stdin.write(chunk)
+            except BrokenPipeError:
+                # encoder exited early, its return code tells why
+                pass
+            finally:
+                # a still running decoder gets SIGPIPE
+                decoder.stdout.close()
+                for encoder in encoders:
+                    try:
+                        encoder.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                if meter:
+                    meter_reader.join()
+                for encoder in encoders:
+                    encoder.wait()
+                decoder.wait()
+                stderr_reader.join()
+
+        # encoder failure kills the decoder too
+        for encoder, encode_cmd in zip(encoders, encode_cmds):
+            if encoder.returncode:
+                raise CalledProcessError(encoder.returncode, encode_cmd)
+        if decoder.returncode:
+            raise CalledProcessError(
+                decoder.returncode, decode_cmd, stderr="".join(decoder_stderr)
+            )
+
+        result = {}
+        if pcm_checksums:
+            result["checksums"] = pcm_checksums.result(
+                sample_size=pcm["bits"] // 8 * pcm["channels"]
+            )
+        if meter:
+            result["levels"] = {
+                **SoxcueEngine._get_levels("".join(decoder_stderr).splitlines()),
+                **meter.result(),
+            }
+        return result
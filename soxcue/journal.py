@@ -0,0 +1,99 @@
+"""
+Write-ahead journal of CUE sheet tracks states
+"""
+
+import json
+import os
+from pathlib import Path
+from threading import RLock
+
+# track states, in order
+STATES = ["planned", "encoding", "encoded", "tagged", "published"]
+
+
+class SoxcueJournalError(Exception):
+    """soxcue journal error"""
+
+
+class Journal:
+    """
+    Append-only JSON lines {"track": index, "state": state, ...}
+    synced before the state is entered, the last line of a track wins
+    Removed once the sheet is done
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # re-entrant: discard_partial() runs in signal handlers too
+        self.lock = RLock()
+        # {track index: last record}
+        self.tracks: dict[str, dict] = {}
+        self.fh = None
+
+    def load(self) -> dict[str, dict]:
+        """
+        Read an interrupted run journal
+        A torn last line (crash while writing) is ignored
+        """
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.tracks[record["track"]] = {
+                        **self.tracks.get(record["track"], {}),
+                        **record,
+                    }
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            raise SoxcueJournalError(f"Couldn't read journal '{self.path}'") from exc
+        return self.tracks
+
+    def set_state(self, track: str, state: str, **fields) -> None:
+        """
+        Record the track state (durably) before entering it
+        """
+        record = {"track": track, "state": state, **fields}
+        with self.lock:
+            if self.fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.fh = open(self.path, "a", encoding="utf-8")
+            self.fh.write(json.dumps(record) + "\n")
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.tracks[track] = {**self.tracks.get(track, {}), **record}
+
+    def get_state(self, track: str) -> str | None:
+        return self.tracks[track]["state"] if track in self.tracks else None
+
+    def discard_partial(self, keep_encoded: bool = False) -> None:
+        """
+        Remove outputs of tracks interrupted before being published
+        keep_encoded: keep complete (encoded/tagged) ones for a resumed run
+        """
+        with self.lock:
+            tracks = list(self.tracks.values())
+        for record in tracks:
+            if record["state"] == "published" or (
+                keep_encoded and record["state"] in ("encoded", "tagged")
+            ):
+                continue
+            for path in record.get("paths", []):
+                Path(path).unlink(missing_ok=True)
+
+    def remove(self) -> None:
+        """
+        Sheet done, nothing to recover
+        """
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.tracks = {}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.fh is not None:
+                self.fh.close()
+                self.fh = None
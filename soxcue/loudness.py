@@ -0,0 +1,164 @@
+"""
+ITU-R BS.1770 (EBU R128, ReplayGain 2.0) loudness
+SoX applies the K-weighting filter, soxcue sums and gates the blocks
+"""
+
+import math
+import sys
+from array import array
+from collections import Counter
+from operator import mul
+from typing import Iterable
+
+# gated blocks, LUFS/LU
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# 400 ms blocks overlapping by 75%: 100 ms steps
+STEPS_PER_BLOCK = 4
+# K-weighting boosts highs by up to 4 dB: attenuate before, compensate after
+METER_VOLUME = 0.5
+# 5.1 (L R C LFE Ls Rs): LFE ignored, surround channels weighted
+CHANNEL_WEIGHTS = {6: (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)}
+# block loudness histogram bin, dB
+HISTOGRAM_STEP = 0.1
+
+
+class SoxcueLoudnessError(Exception):
+    """soxcue loudness error"""
+
+
+def get_filters(rate: int) -> list[tuple[float, ...]]:
+    """
+    K-weighting biquads (b0 b1 b2 a0 a1 a2) for a sample rate:
+    high shelf then high pass, coefficients as in libebur128
+    """
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / rate)
+    vh = 10 ** (gain / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1.0,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    )
+
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / rate)
+    a0 = 1 + k / q + k * k
+    highpass = (1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0)
+    return [shelf, highpass]
+
+
+def get_block_loudness(power: float) -> float:
+    """
+    Loudness of a block mean square (channels weighted sum)
+    """
+    return -0.691 + 10 * math.log10(power) if power > 0 else -math.inf
+
+
+def get_gated_loudness(blocks: Iterable[tuple[float, int]]) -> float:
+    """
+    Integrated loudness of (block power, count) pairs
+    Silence (every block gated) is ABSOLUTE_GATE
+    """
+    blocks = [
+        (power, count)
+        for power, count in blocks
+        if get_block_loudness(power) > ABSOLUTE_GATE
+    ]
+    if not blocks:
+        return ABSOLUTE_GATE
+    gate = (
+        get_block_loudness(
+            sum(power * count for power, count in blocks)
+            / sum(count for _, count in blocks)
+        )
+        + RELATIVE_GATE
+    )
+    blocks = [
+        (power, count) for power, count in blocks if get_block_loudness(power) > gate
+    ]
+    return get_block_loudness(
+        sum(power * count for power, count in blocks)
+        / sum(count for _, count in blocks)
+    )
+
+
+def get_histogram_loudness(histograms: list[list[list[int]]]) -> float:
+    """
+    Integrated loudness of several tracks (album) block histograms
+    """
+    counts: Counter[int] = Counter()
+    for histogram in histograms:
+        for loudness_bin, count in histogram:
+            counts[loudness_bin] += count
+    return get_gated_loudness(
+        (10 ** ((loudness_bin * HISTOGRAM_STEP + 0.691) / 10), count)
+        for loudness_bin, count in counts.items()
+    )
+
+
+class LoudnessMeter:
+    """
+    Sum K-weighted float32 samples (interleaved, little-endian)
+    into 100 ms steps mean squares
+    """
+
+    def __init__(self, rate: int, channels: int):
+        self.channels = channels
+        self.weights = CHANNEL_WEIGHTS.get(channels)
+        # samples (all channels) per step
+        self.step_size = rate // 10 * channels
+        self.buffer = bytearray()
+        self.steps: list[float] = []
+
+    def update(self, data: bytes) -> None:
+        self.buffer += data
+        end = len(self.buffer) - len(self.buffer) % (self.step_size * 4)
+        samples = array("f")
+        with memoryview(self.buffer) as view:
+            samples.frombytes(view[:end])
+        del self.buffer[:end]
+        if sys.byteorder == "big":
+            samples.byteswap()
+
+        frames = self.step_size // self.channels
+        for start in range(0, len(samples), self.step_size):
+            step = samples[start : start + self.step_size]
+            if self.weights:
+                power = sum(
+                    weight
+                    * sum(
+                        map(mul, step[idx :: self.channels], step[idx :: self.channels])
+                    )
+                    for idx, weight in enumerate(self.weights)
+                    if weight
+                )
+            else:
+                power = sum(map(mul, step, step))
+            self.steps.append(power / frames / METER_VOLUME**2)
+
+    def result(self) -> dict:
+        """
+        Integrated loudness, LUFS
+        and the histogram of blocks above the absolute gate, for album loudness:
+        [[block loudness / HISTOGRAM_STEP, count], ...]
+        Trailing samples short of a 100 ms step are ignored
+        """
+        blocks = [
+            sum(self.steps[idx : idx + STEPS_PER_BLOCK]) / STEPS_PER_BLOCK
+            for idx in range(len(self.steps) - STEPS_PER_BLOCK + 1)
+        ]
+        histogram = Counter(
+            round(get_block_loudness(power) / HISTOGRAM_STEP)
+            for power in blocks
+            if get_block_loudness(power) > ABSOLUTE_GATE
+        )
+        return {
+            "loudness": round(get_gated_loudness((power, 1) for power in blocks), 2),
+            "blocks": sorted([k, v] for k, v in histogram.items()),
+        }
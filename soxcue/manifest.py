@@ -0,0 +1,87 @@
+"""
+Records of produced tracks
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+MANIFEST_DIR = ".soxcue"
+
+
+class SoxcueManifestError(Exception):
+    """soxcue manifest error"""
+
+
+class Manifest:
+    """
+    Per CUE sheet sidecar in the output root directory
+    {output path relative to the root: record}
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.root = path.parent.parent
+        try:
+            with open(path, encoding="utf-8") as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as exc:
+            raise SoxcueManifestError(f"Couldn't read manifest '{path}'") from exc
+
+        self.cue_path = manifest.get("cue_path")
+        self.records: dict[str, dict] = manifest.get("tracks", {})
+
+    @classmethod
+    def for_sheet(cls, root: Path, cue_path: Path) -> "Manifest":
+        """
+        CUE sheet manifest in the output root
+        """
+        manifest = cls(
+            root.joinpath(
+                MANIFEST_DIR,
+                f"{hashlib.sha1(str(cue_path.absolute()).encode()).hexdigest()}.json",
+            )
+        )
+        manifest.cue_path = str(cue_path.absolute())
+        return manifest
+
+    @classmethod
+    def find(cls, src_dir: Path) -> Iterator["Manifest"]:
+        """
+        Search for manifests in src_dir
+        """
+        for root, dirs, _ in os.walk(src_dir):
+            if MANIFEST_DIR in dirs:
+                for manifest in sorted(Path(root, MANIFEST_DIR).glob("*.json")):
+                    yield cls(manifest)
+
+    def get_path(self, record_key: str) -> Path:
+        """
+        Absolute output path of a record
+        """
+        return self.root.joinpath(record_key)
+
+    def set_record(self, dst_path: Path, record: dict) -> None:
+        """
+        Add/replace output file record
+        """
+        self.records[str(dst_path.relative_to(self.root))] = record
+
+    def save(self) -> None:
+        """
+        Atomically write manifest
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(
+                {"cue_path": self.cue_path, "tracks": self.records},
+                fh,
+                indent=1,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
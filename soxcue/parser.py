@@ -2,6 +2,8 @@
 Cue file parser
 """
 
+import io
+import locale
 from dataclasses import dataclass
 from pathlib import Path
 import chardet
@@ -109,16 +111,26 @@ class CueParser:
         """
         Attempt to read and parse CUE sheet from file
         """
-        cue_file = Path(file_path).absolute()
+        with open(Path(file_path).absolute(), "rb") as fh:
+            return CueParser.from_bytes(fh.read(), cue_encoding)
 
+    @staticmethod
+    def from_bytes(
+        data: bytes, cue_encoding: str = None
+    ) -> tuple[CueMetaData, list[TrackProperties]]:
+        """
+        Attempt to decode and parse CUE sheet file contents
+        (e.g. read from an archive)
+        """
         if not cue_encoding:
-            with open(cue_file, "rb") as fh:
-                cue_encoding = chardet.detect(fh.read())["encoding"]
-
-        with open(cue_file, encoding=cue_encoding) as fh:
-            try:
-                lines = fh.readlines()
-            except UnicodeDecodeError as exc:
-                raise ParserError("Couldn't decode CUE sheet file") from exc
+            cue_encoding = chardet.detect(data)["encoding"]
+
+        try:
+            lines = io.StringIO(
+                data.decode(cue_encoding or locale.getpreferredencoding(False)),
+                newline=None,
+            ).readlines()
+        except UnicodeDecodeError as exc:
+            raise ParserError("Couldn't decode CUE sheet file") from exc
 
         return CueParser(lines).parse_cue_sheet()
@@ -0,0 +1,137 @@
+"""
+Source files read-ahead
+"""
+
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from threading import Lock
+from soxcue.schedule import DeviceScheduler
+
+CHUNK_SIZE = 1 << 20
+
+
+class SoxcuePrefetchError(Exception):
+    """soxcue prefetch error"""
+
+
+class Prefetcher:
+    """
+    Read upcoming source files into the page cache in background
+    Bounded by budget bytes, least recently used files are evicted first
+    Reads take a device slot of the jobs scheduler, and its bandwidth,
+    only once jobs leave one free
+    """
+
+    def __init__(self, budget: int):
+        """
+        budget: bytes
+        """
+        self.budget = budget
+        # {path: prefetched bytes}
+        self.cached: OrderedDict[Path, int] = OrderedDict()
+        # {path: sheets reading it}
+        self.pinned: Counter[Path] = Counter()
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.closed = False
+
+    def prefetch(
+        self, paths: list[Path], scheduler: DeviceScheduler | None = None
+    ) -> None:
+        """
+        Queue files read-ahead
+        """
+        for path in dict.fromkeys(paths):
+            self.executor.submit(self._prefetch, path, scheduler)
+
+    def pin(self, paths: list[Path]) -> None:
+        """
+        Keep files being read from eviction
+        """
+        with self.lock:
+            self.pinned.update(dict.fromkeys(paths, 1))
+
+    def release(self, paths: list[Path]) -> None:
+        """
+        Unpin files, drop them from the page cache
+        once no other sheet reads them
+        """
+        with self.lock:
+            for path in dict.fromkeys(paths):
+                self.pinned[path] -= 1
+                if self.pinned[path] > 0:
+                    continue
+                del self.pinned[path]
+                if path in self.cached:
+                    self._evict(path)
+
+    def close(self) -> None:
+        """
+        Stop prefetching
+        """
+        self.closed = True
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _evict(self, path: Path) -> None:
+        """
+        Advise kernel the file pages can go
+        """
+        size = self.cached.pop(path)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def _reserve(self, path: Path) -> int:
+        """
+        Evict least recently used files until the path fits
+        Return bytes to prefetch
+        """
+        with self.lock:
+            if path in self.cached:
+                self.cached.move_to_end(path)
+                return 0
+
+            size = path.stat().st_size
+            for cached in list(self.cached):
+                if sum(self.cached.values()) + size <= self.budget:
+                    break
+                if cached not in self.pinned:
+                    self._evict(cached)
+
+            # whatever fits of the file beginning
+            if (size := min(size, self.budget - sum(self.cached.values()))) > 0:
+                self.cached[path] = size
+                return size
+            return 0
+
+    def _prefetch(self, path: Path, scheduler: DeviceScheduler | None = None) -> None:
+        """
+        Hint the kernel, then read sequentially
+        (network filesystems don't always honor the hint)
+        """
+        try:
+            if not (size := self._reserve(path)):
+                return
+
+            buffer = bytearray(CHUNK_SIZE)
+            with (
+                scheduler.reserve_read(path, size) if scheduler else nullcontext()
+            ), open(path, "rb", buffering=0) as fh:
+                os.posix_fadvise(fh.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+                read = 0
+                while not self.closed and read < size:
+                    if not (chunk_size := fh.readinto(buffer)):
+                        break
+                    read += chunk_size
+        except OSError:
+            # prefetch is best effort
+            with self.lock:
+                self.cached.pop(path, None)
@@ -2,19 +2,15 @@
 soxcue process
 """
 
-import os
-from concurrent.futures import (
-    ProcessPoolExecutor,
-    ThreadPoolExecutor,
-    as_completed,
-)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from datetime import timedelta
-from subprocess import run, STDOUT
-from mutagen import File
+from typing import Iterator
 from soxcue.sheets import SoxcueSheet
 from soxcue.config import Config
-from soxcue.tagging import Tags
-from soxcue.status import SoxcueStatus
+from soxcue.engine import TRACK_ERRORS, SoxcueEngine, SoxcueEngineError
+from soxcue.parser import TrackProperties
+from soxcue.status import FINAL_STATUSES, SoxcueStatus
 
 
 class SoxcueProcessError(Exception):
@@ -24,69 +20,88 @@ class SoxcueProcessError(Exception):
 class SoxcueProcess:  # pylint: disable=too-few-public-methods
     """
     Main process and status update UI
+    The engine works on several CUE sheets at once, shown one at a time in order
     """
 
     def __init__(
         self,
-        cue_sheet: SoxcueSheet,
+        cue_sheets: list[SoxcueSheet],
         config: Config,
+        engine: SoxcueEngine,
     ):
-        self.tracks_status = {
-            track.index: {
-                "filename": track.dst_path.name,
-                "duration": self._get_duration(
-                    (track.end if track.end != 0 else File(track.src_path).info.length)
-                    - track.start
-                ),
-                "status": "waiting",
+        self.cue_sheets = cue_sheets
+        self.config = config
+        self.engine = engine
+        # by CUE sheet path, updated by the engine whether shown or not
+        self.sheets_status = {
+            cue_sheet.cue_path: {
+                track.index: {
+                    "filename": track.dst_path.name,
+                    "duration": "",
+                    "status": "waiting",
+                }
+                for track in cue_sheet.tracks
             }
-            for track in cue_sheet.tracks
+            for cue_sheet in cue_sheets
         }
-        self.tagger = Tags(cue_sheet=cue_sheet, config=config)
-
-        executor = ThreadPoolExecutor()
-        status = SoxcueStatus(
-            cue_sheet=cue_sheet,
-            config=config,
-            tracks_status=self.tracks_status,
-        )
-        executor.submit(status.handler.update)
-        self.process_sheet(cue_sheet=cue_sheet)
-        executor.shutdown()
 
-    def process_sheet(self, cue_sheet: SoxcueSheet) -> None:
+    def run(self) -> Iterator[tuple[SoxcueSheet, Exception | None]]:
         """
-        Run splitting jobs
+        Process sheets, yield each with its error (if any) once done, in order
         """
+        sheet_jobs = None
+        for idx, cue_sheet in enumerate(self.cue_sheets):
+            tracks_status = self.sheets_status[cue_sheet.cue_path]
+            for track in cue_sheet.tracks:
+                tracks_status[track.index]["duration"] = self._get_track_duration(
+                    self.engine, track
+                )
 
-        cue_sheet.tracks[0].dst_path.parent.mkdir(parents=True, exist_ok=True)
-        with ProcessPoolExecutor(os.cpu_count() - 1) as ex:
-            futures = {
-                ex.submit(self._sox_process, track.sox_cmd): track.index
-                for track in cue_sheet.tracks
-            }
-
-            for future in futures:
-                self.tracks_status[futures[future]]["status"] = "sox"
-
-            for future in as_completed(futures):
-                if future.exception():
-                    for future in futures:
-                        future.cancel()
-                    raise future.exception()
-
-                self.tracks_status[futures[future]]["status"] = "tagging"
-
-                self.tagger.write_tags(
-                    self.tagger.get_track_tags(
-                        track=[
-                            track
-                            for track in cue_sheet.tracks
-                            if track.index == futures[future]
-                        ][0],
+            executor = ThreadPoolExecutor()
+            status = SoxcueStatus(
+                cue_sheet=cue_sheet,
+                # the wait delays the whole run, later sheets are underway
+                config=(
+                    self.config
+                    if sheet_jobs is None
+                    else replace(
+                        self.config, runtime_=replace(self.config.runtime_, time_wait=0)
                     )
-                )
-                self.tracks_status[futures[future]]["status"] = "done"
+                ),
+                tracks_status=tracks_status,
+            )
+            executor.submit(status.handler.update)
+            try:
+                if sheet_jobs is None:
+                    sheet_jobs = self.engine.submit_sheets(
+                        self.cue_sheets, self.config, progress=self._set_status
+                    )
+                exc = sheet_jobs[idx].future.exception()
+            finally:
+                # status UI stops once every track is final
+                for track_status in tracks_status.values():
+                    if track_status["status"] not in FINAL_STATUSES:
+                        track_status["status"] = "failed"
+                executor.shutdown()
+            yield cue_sheet, exc
+
+    def _set_status(
+        self, cue_sheet: SoxcueSheet, track: TrackProperties, status: str
+    ) -> None:
+        """
+        Engine progress callback
+        """
+        # pylint: disable=unused-argument
+        self.sheets_status[cue_sheet.cue_path][track.index]["status"] = status
+
+    def _get_track_duration(self, engine: SoxcueEngine, track: TrackProperties) -> str:
+        """
+        Track duration timestamp, unknown for unreadable sources (the track fails)
+        """
+        try:
+            return self._get_duration(engine.get_track_length(track))
+        except (SoxcueEngineError, *TRACK_ERRORS):
+            return "?"
 
     @staticmethod
     def _get_duration(seconds: float) -> str:
@@ -95,10 +110,3 @@ class SoxcueProcess:  # pylint: disable=too-few-public-methods
         """
 
         return str(timedelta(seconds=int(seconds)))
-
-    @staticmethod
-    def _sox_process(sox_cmd: str) -> None:
-        """
-        Execute SoX process
-        """
-        run(sox_cmd, shell=True, check=True, stderr=STDOUT)
@@ -0,0 +1,138 @@
+"""
+Profiling of soxcue stages, main and worker processes
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+# stack sampling period, seconds
+SAMPLE_INTERVAL = 0.005
+
+# worker process profilers, by stage
+WORKER_PROFILERS: dict[str, "Profiler"] = {}
+
+
+class SoxcueProfilingError(Exception):
+    """soxcue profiling error"""
+
+
+class Profiler:
+    """
+    Deterministic (cProfile: calling thread and threads started while profiling)
+    and sampling (all threads) profiler
+    Writes <stage>.<pid>.pstats and <stage>.<pid>.collapsed (flamegraph.pl input)
+    Can be started/stopped repeatedly, results accumulate
+    """
+
+    def __init__(self, directory: Path, stage: str):
+        self.directory = directory
+        self.stage = stage
+        self.profile = cProfile.Profile()
+        # one per thread started while profiling, merged at dump
+        self.thread_profiles: list[cProfile.Profile] = []
+        self.lock = threading.Lock()
+        # {"thread;frame;frame": samples}
+        self.stacks: Counter[str] = Counter()
+        self.sampler: threading.Thread | None = None
+        self.stopped = threading.Event()
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+        threading.setprofile(self._start_thread)
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+        threading.setprofile(None)
+        self.stopped.set()
+        if self.sampler:
+            self.sampler.join()
+            self.sampler = None
+
+    def dump(self) -> None:
+        """
+        Write the results so far
+        """
+        path = self.directory / f"{self.stage}.{os.getpid()}"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                stats = pstats.Stats(self.profile)
+                for thread_profile in self.thread_profiles:
+                    stats.add(thread_profile)
+            stats.dump_stats(f"{path}.pstats")
+            with open(f"{path}.collapsed", "w", encoding="utf-8") as fh:
+                for stack, count in sorted(self.stacks.items()):
+                    fh.write(f"{stack} {count}\n")
+        except OSError as exc:
+            raise SoxcueProfilingError(f"Couldn't write profile '{path}'") from exc
+
+    def _start_thread(self, *args) -> None:
+        """
+        First profile event of a new thread: cProfile it on its own
+        (cProfile only profiles the thread enabling it)
+        """
+        # pylint: disable=unused-argument
+        thread_profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append(thread_profile)
+        thread_profile.enable()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({Path(code.co_filename).name}"
+                        f":{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+@contextmanager
+def profile(directory: Path | None, stage: str) -> Iterator[None]:
+    """
+    Profile the block as a stage, no-op without a directory
+    """
+    if directory is None:
+        yield
+        return
+    profiler = Profiler(directory, stage)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profiler.dump()
+
+
+def profile_call(directory: Path, stage: str, func: Callable, args: tuple):
+    """
+    Worker side: profile a job call, jobs of a stage accumulate per process
+    """
+    if stage not in WORKER_PROFILERS:
+        WORKER_PROFILERS[stage] = Profiler(directory, stage)
+    profiler = WORKER_PROFILERS[stage]
+    profiler.start()
+    try:
+        return func(*args)
+    finally:
+        profiler.stop()
+        profiler.dump()
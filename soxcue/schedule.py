@@ -0,0 +1,297 @@
+"""
+Device aware jobs scheduling
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Condition
+from typing import Callable, Iterator
+from soxcue.background import PressureThrottle
+
+# default concurrency for spinning disks if not configured
+ROTATIONAL_JOBS = 2
+
+
+class SoxcueScheduleError(Exception):
+    """soxcue schedule error"""
+
+
+@dataclass
+class ScheduledJob:
+    """
+    Single executor job
+    with the devices it reads from/writes to
+    and an estimated amount of data it reads from read_device
+    """
+
+    key: str
+    func: Callable
+    args: tuple
+    devices: frozenset[int]
+    read_device: int | None = None
+    nbytes: int = 0
+    future: Future | None = field(default=None, init=False)
+
+
+@dataclass
+class ScheduledRun:
+    """
+    Jobs of one run() call (a CUE sheet)
+    queues: per devices set, round robin
+    """
+
+    executor: Executor
+    queues: deque[deque[ScheduledJob]]
+    running: list[ScheduledJob] = field(default_factory=list)
+    started: list[ScheduledJob] = field(default_factory=list)
+
+
+class DeviceScheduler:
+    """
+    Dispatch jobs to an executor
+    Limit concurrent jobs and read bandwidth per device (st_dev)
+    Interleave jobs of different devices
+    Shared by concurrent run() calls (CUE sheets processed at once):
+    limits are global, free slots go to the earliest run first,
+    so later runs fill what it can't use (other devices, its last tracks)
+    """
+
+    def __init__(
+        self,
+        max_jobs: int,
+        device_jobs: dict[str, int] | None = None,
+        bandwidth: dict[str, float] | None = None,
+        throttle: PressureThrottle | None = None,
+    ):
+        """
+        device_jobs/bandwidth keys are paths on a device
+        or "" for every device not listed.
+        bandwidth values are MB/s
+        throttle: lowers max_jobs under system pressure
+        """
+        self.max_jobs = max_jobs
+        self.throttle = throttle
+        device_jobs = dict(device_jobs or {})
+        bandwidth = dict(bandwidth or {})
+
+        self.default_jobs = device_jobs.pop("", None)
+        self.default_bandwidth = bandwidth.pop("", None)
+        self.device_jobs = {self.get_device(k): v for k, v in device_jobs.items()}
+        self.bandwidth = {self.get_device(k): v for k, v in bandwidth.items()}
+
+        self.running: dict[int, int] = {}
+        self.next_read: dict[int, float] = {}
+        # running jobs of all runs
+        self.jobs = 0
+        # reads outside jobs holding a device slot (prefetch)
+        self.reads = 0
+        self.runs: list[ScheduledRun] = []
+        self.cond = Condition()
+
+    @staticmethod
+    def get_device(path: Path | str) -> int:
+        """
+        st_dev of the path or its closest existing parent
+        """
+        path = Path(path).absolute()
+        for parent in [path, *path.parents]:
+            try:
+                return os.stat(parent).st_dev
+            except OSError:
+                continue
+        raise SoxcueScheduleError(f"Couldn't stat '{path}'")
+
+    @staticmethod
+    def is_rotational(device: int) -> bool:
+        """
+        Check sysfs for a spinning disk (block devices only)
+        """
+        sys_dev = Path(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+        for rotational in [
+            sys_dev.joinpath("queue", "rotational"),
+            sys_dev.joinpath("..", "queue", "rotational"),
+        ]:
+            try:
+                return rotational.read_text().strip() == "1"
+            except OSError:
+                continue
+        return False
+
+    def get_jobs_limit(self, device: int) -> int | None:
+        """
+        Concurrent jobs limit for the device
+        """
+        if device not in self.device_jobs:
+            self.device_jobs[device] = (
+                self.default_jobs
+                if self.default_jobs
+                else ROTATIONAL_JOBS if self.is_rotational(device) else None
+            )
+        return self.device_jobs[device]
+
+    def get_read_delay(self, job: ScheduledJob, now: float) -> float:
+        """
+        Seconds until the job can start without exceeding
+        its source device bandwidth
+        """
+        if not self.bandwidth.get(job.read_device, self.default_bandwidth):
+            return 0
+        return max(self.next_read.get(job.read_device, now) - now, 0)
+
+    def is_ready(self, job: ScheduledJob) -> bool:
+        """
+        Check job devices have a free slot
+        """
+        return all(
+            (limit := self.get_jobs_limit(device)) is None
+            or self.running.get(device, 0) < limit
+            for device in job.devices
+        )
+
+    def _charge_read(self, device: int | None, nbytes: int, now: float) -> None:
+        if rate := self.bandwidth.get(device, self.default_bandwidth):
+            self.next_read[device] = max(
+                self.next_read.get(device, now), now
+            ) + nbytes / (rate * 1024 * 1024)
+
+    def _acquire(self, job: ScheduledJob, now: float) -> None:
+        self.jobs += 1
+        for device in job.devices:
+            self.running[device] = self.running.get(device, 0) + 1
+        # bytes read are only charged to the source device
+        self._charge_read(job.read_device, job.nbytes, now)
+
+    @contextmanager
+    def reserve_read(self, path: Path, nbytes: int) -> Iterator[None]:
+        """
+        Hold a slot of the path device for a read outside jobs (prefetch),
+        paced by the device bandwidth cap like a job read
+        Waits for jobs to leave a slot free, takes none of max_jobs
+        """
+        device = self.get_device(path)
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                limit = self.get_jobs_limit(device)
+                delay = (
+                    max(self.next_read.get(device, now) - now, 0)
+                    if self.bandwidth.get(device, self.default_bandwidth)
+                    else 0
+                )
+                if not delay and (limit is None or self.running.get(device, 0) < limit):
+                    break
+                self.cond.wait(timeout=delay or None)
+            self.reads += 1
+            self.running[device] = self.running.get(device, 0) + 1
+            self._charge_read(device, nbytes, now)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.reads -= 1
+                self.running[device] -= 1
+                self.cond.notify_all()
+
+    def _release(self, job: ScheduledJob) -> None:
+        with self.cond:
+            self.jobs -= 1
+            for device in job.devices:
+                self.running[device] -= 1
+            self.cond.notify_all()
+
+    def _dispatch(self, now: float) -> float | None:
+        """
+        Start every job that fits, earliest run first
+        Return seconds until a bandwidth delayed job can start, if any
+        """
+        max_jobs = (
+            self.throttle.get_limit(self.max_jobs) if self.throttle else self.max_jobs
+        )
+        delay = None
+        for run in self.runs:
+            queues = run.queues
+            # round robin over devices queues
+            idle = 0
+            while queues and idle < len(queues) and self.jobs < max_jobs:
+                queue = queues[0]
+                queues.rotate(-1)
+                if not self.is_ready(queue[0]):
+                    idle += 1
+                    continue
+                if (job_delay := self.get_read_delay(queue[0], now)) > 0:
+                    delay = job_delay if delay is None else min(delay, job_delay)
+                    idle += 1
+                    continue
+
+                job = queue.popleft()
+                if not queue:
+                    queues.remove(queue)
+                idle = 0
+                try:
+                    job.future = run.executor.submit(job.func, *job.args)
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    # broken pool: the job fails, no slot taken
+                    job.future = Future()
+                    job.future.set_exception(exc)
+                    run.running.append(job)
+                    continue
+                self._acquire(job, now)
+                run.running.append(job)
+                run.started.append(job)
+                # slot freed once done, whoever collects the job
+                job.future.add_done_callback(lambda _, job=job: self._release(job))
+        return delay
+
+    def run(
+        self,
+        executor: Executor,
+        jobs: list[ScheduledJob],
+        on_start: Callable[[ScheduledJob], None] | None = None,
+    ) -> Iterator[ScheduledJob]:
+        """
+        Submit jobs as their devices allow
+        Yield jobs in completion order
+        """
+        run = ScheduledRun(executor=executor, queues=deque())
+        by_devices: dict[frozenset[int], deque[ScheduledJob]] = {}
+        for job in jobs:
+            if job.devices not in by_devices:
+                by_devices[job.devices] = deque()
+                run.queues.append(by_devices[job.devices])
+            by_devices[job.devices].append(job)
+
+        with self.cond:
+            self.runs.append(run)
+        try:
+            while run.queues or run.running:
+                with self.cond:
+                    while True:
+                        delay = self._dispatch(time.monotonic())
+                        started, run.started = run.started, []
+                        done = [job for job in run.running if job.future.done()]
+                        if started or done or not (run.queues or run.running):
+                            break
+                        if not self.jobs and not self.reads and delay is None:
+                            raise SoxcueScheduleError("No job can be started")
+                        if self.throttle and run.queues:
+                            # ramp up without waiting for a job to finish
+                            delay = min(
+                                delay or self.throttle.interval, self.throttle.interval
+                            )
+                        # woken up by any run job done
+                        self.cond.wait(timeout=delay)
+
+                for job in started:
+                    if on_start:
+                        on_start(job)
+                for job in done:
+                    run.running.remove(job)
+                    yield job
+        finally:
+            with self.cond:
+                self.runs.remove(run)
@@ -5,17 +5,116 @@ Generate SoX jobs
 
 import re
 import os
-from dataclasses import dataclass
+from subprocess import CalledProcessError, run
+from dataclasses import dataclass, field, replace
 from typing import Iterator
 from pathlib import Path
-from soxcue.parser import CueParser, CueMetaData, TrackProperties
-from soxcue.config import Config
+from mutagen import MutagenError
+from soxcue.archive import (
+    SoxcueArchiveError,
+    get_real_path,
+    get_stream_cmd,
+    is_archive,
+    is_compressed_tar_name,
+    probe,
+    read_source,
+    split_member,
+)
+from soxcue.parser import CueParser, CueMetaData, ParserError, TrackProperties
+from soxcue.backends import BackendSelector, SoxBackend
+from soxcue.config import Config, OutputTarget
+from soxcue.walker import TRACKS_DIR, DirWalker
+
+# AccurateRip CRCs are defined for CD audio only
+CDDA_FORMAT = {"rate": 44100, "bits": 16, "channels": 2}
+# PCM checksums of these formats match the source ones
+LOSSLESS_FORMATS = ["aiff", "aif", "au", "caf", "flac", "sox", "w64", "wav", "wv"]
 
 
 class SoxcueSheetsError(Exception):
     """soxcue sheets error"""
 
 
+# errors of a single CUE sheet (unreadable, missing sources), others are planned
+SHEET_ERRORS = (
+    OSError,
+    LookupError,
+    MutagenError,
+    ParserError,
+    SoxcueArchiveError,
+    SoxcueSheetsError,
+)
+
+
+@dataclass
+class DirIndex:
+    """
+    Single directory listing
+    with a case-insensitive stem -> files lookup
+    """
+
+    directory: Path
+    files: dict[str, Path] = field(default_factory=dict)
+    stems: dict[str, list[Path]] = field(default_factory=dict)
+
+    @classmethod
+    def from_names(cls, directory: Path, names: list[str]) -> "DirIndex":
+        """
+        Index file names already listed by the caller (e.g. os.walk)
+        """
+        dir_index = cls(directory=directory)
+        for name in names:
+            file_path = directory.joinpath(name)
+            dir_index.files[name] = file_path
+            dir_index.stems.setdefault(os.path.splitext(name)[0].lower(), []).append(
+                file_path
+            )
+        return dir_index
+
+    @classmethod
+    def from_dir(cls, directory: Path) -> "DirIndex":
+        """
+        List and index a directory (one directory read)
+        """
+        try:
+            with os.scandir(directory) as entries:
+                names = [entry.name for entry in entries if entry.is_file()]
+        except OSError:
+            names = []
+        return cls.from_names(directory, names)
+
+    def resolve(self, name: str, formats: list[str]) -> Path | None:
+        """
+        Find file by its exact name
+        or by its stem (case-insensitive) with any of the formats as suffix
+        """
+        if name in self.files:
+            return self.files[name]
+
+        candidates = {
+            os.path.splitext(x.name)[1][1:].lower(): x
+            for x in self.stems.get(os.path.splitext(name)[0].lower(), [])
+        }
+        for aformat in formats:
+            if aformat in candidates:
+                return candidates[aformat]
+        return None
+
+
+@dataclass
+class TrackOutput:
+    """
+    Single output file of a track
+    """
+
+    target: OutputTarget
+    dst_root: Path
+    dst_path: Path
+    encode_cmd: str | None = None
+    # source file copied, not encoded
+    copy: bool = False
+
+
 @dataclass
 class SoxcueSheet:
     """
@@ -27,6 +126,7 @@ class SoxcueSheet:
     tracks: list[TrackProperties]
     cue_path: Path
     cover_path: Path | None
+    dst_root: Path | None = None
 
 
 class SoxcueSheets:
@@ -43,46 +143,127 @@ class SoxcueSheets:
         Verify requested destination format is supported
         Verify input path exists
         Generate SoxcueSheet objects
+        CUE sheets that can't be planned are kept in failed
         """
 
-        if config.output_.enc_format not in config.runtime_.sox.supported_formats:
-            raise SoxcueSheetsError(
-                f"Destination format '{config.output_.enc_format}' "
-                f"is not supported by {config.runtime_.sox.exe_name}"
+        # main output first, all options set
+        main_target = (
+            config.output_.main_target
+            if config.output_.main_target
+            else OutputTarget(enc_format=config.output_.enc_format)
+        )
+        self.targets = [
+            self.get_target(
+                replace(
+                    main_target,
+                    enc_format=config.output_.enc_format,
+                    comp_level=config.runtime_.sox.comp_level,
+                    naming_spec=config.runtime_.naming_spec,
+                    dst_dir=config.output_.dst_dir,
+                ),
+                config,
+            )
+        ] + [
+            self.get_target(
+                replace(
+                    target,
+                    naming_spec=(
+                        target.naming_spec
+                        if target.naming_spec
+                        else config.runtime_.naming_spec
+                    ),
+                    dst_dir=(
+                        target.dst_dir if target.dst_dir else config.output_.dst_dir
+                    ),
+                ),
+                config,
             )
+            for target in config.output_.targets
+        ]
+
+        for target in self.targets:
+            if target.enc_format not in config.runtime_.sox.supported_formats:
+                raise SoxcueSheetsError(
+                    f"Destination format '{target.enc_format}' "
+                    "is not supported by "
+                    f"{config.runtime_.sox.exe_name or 'the simulated backend'}"
+                )
 
         if not config.input_.src_path.exists():
             raise SoxcueSheetsError(f"Source path '{config.input_.src_path}' not found")
+        if is_compressed_tar_name(config.input_.src_path.name):
+            raise SoxcueSheetsError(
+                f"Compressed tar archive '{config.input_.src_path}' can't be read "
+                "per track without decompressing it again, use .tar or .zip"
+            )
 
         self.config = config
-        self.found_sheets = [
-            SoxcueSheet(
-                metadata=cue_tracks[0],
-                tracks=cue_tracks[1],
-                cue_path=(
-                    cue_cover["cue"]
-                    if config.input_.src_path.is_dir()
-                    else config.input_.src_path
-                ),
-                cover_path=cue_cover["cover"],
+        self.backends = BackendSelector(config, backend=config.runtime_.backend)
+        # a directory or an archive, otherwise a single CUE sheet
+        is_tree = self.is_tree(config.input_.src_path)
+        cue_covers = list(
+            self.find_cue_cover(
+                config.input_.src_path if is_tree else config.input_.src_path.parent
             )
-            for cue_cover in self.find_cue_cover(
-                config.input_.src_path
-                if config.input_.src_path.is_dir()
-                else config.input_.src_path.parent
-            )
-            if (
-                cue_tracks := CueParser.from_file(
-                    file_path=(
-                        cue_cover["cue"]
-                        if config.input_.src_path.is_dir()
-                        else config.input_.src_path
-                    ),
-                    cue_encoding=config.runtime_.cue_encoding,
+        )
+        # reuse directory listings produced while searching for CUE sheets
+        self.dir_indexes = {
+            x["dir_index"].directory: x["dir_index"] for x in cue_covers
+        }
+        self.pcm_formats: dict[Path, dict[str, int]] = {}
+        # {CUE sheet path: error}
+        self.failed: dict[Path, Exception] = {}
+        self.found_sheets = []
+        for cue_cover in cue_covers:
+            cue_path = cue_cover["cue"] if is_tree else config.input_.src_path
+            try:
+                metadata, tracks = CueParser.from_bytes(
+                    read_source(cue_path), cue_encoding=config.runtime_.cue_encoding
                 )
-            )[1]
-        ]
-        self.cue_sheets = [self.set_track_attrs(sheet) for sheet in self.found_sheets]
+            except SHEET_ERRORS as exc:
+                self.failed[cue_path] = exc
+                continue
+            if tracks:
+                self.found_sheets.append(
+                    SoxcueSheet(
+                        metadata=metadata,
+                        tracks=tracks,
+                        cue_path=cue_path,
+                        cover_path=cue_cover["cover"],
+                    )
+                )
+        self.cue_sheets = []
+        for sheet in self.found_sheets:
+            try:
+                self.cue_sheets.append(self.set_track_attrs(sheet))
+            except SHEET_ERRORS as exc:
+                self.failed[sheet.cue_path] = exc
+
+    @staticmethod
+    def is_tree(src_path: Path) -> bool:
+        """
+        Source path searched for CUE sheets: a directory or an archive
+        """
+        return src_path.is_dir() or is_archive(src_path)
+
+    @staticmethod
+    def get_target(target: OutputTarget, config: Config) -> OutputTarget:
+        """
+        Fill output target options unset by the user from the preset
+        """
+        preset = config.runtime_.preset
+        return replace(
+            target,
+            comp_level=(
+                target.comp_level
+                if target.comp_level is not None
+                else preset.comp_levels.get(target.enc_format)
+            ),
+            rate_quality=(
+                target.rate_quality if target.rate_quality else preset.rate_quality
+            ),
+            dither=target.dither if target.dither is not None else preset.dither,
+        )
 
     def set_track_attrs(self, cue_sheet: SoxcueSheet) -> SoxcueSheet:
         """
@@ -92,38 +273,26 @@ class SoxcueSheets:
         Assign SoX cmdlines to tracks
         """
         tracks = cue_sheet.tracks
-        output_filenames = [
-            self.convert_spec(
-                track=track,
-                cue_sheet=cue_sheet,
-            )
-            for track in tracks
+        outputs_paths = [
+            self.get_output_paths(cue_sheet=cue_sheet, target=target)
+            for target in self.targets
         ]
-
-        # support 1 directory level in naming_spec
-        if len(output_filenames[0].split("/")) == 2:
-            directory_name = output_filenames[0].split("/")[0]
-            output_filenames = [x.split("/")[1] for x in output_filenames]
-        else:
-            directory_name = ""
+        cue_sheet.dst_root = outputs_paths[0][0]
+        # decode once, pipe PCM to every encoder
+        pcm_pipe = self.config.output_.checksums or len(self.targets) > 1
 
         tracks_count = len(tracks)
         for idx, track in enumerate(tracks):
             src_file = cue_sheet.cue_path.parent.joinpath(track.file).absolute()
 
-            if not src_file.is_file():
-                # CUE sheet referenced file not found
-                # try other SoX supported file formats in this directory
-                for aformat in self.config.runtime_.sox.supported_formats:
-                    if (
-                        src_file := cue_sheet.cue_path.parent.joinpath(
-                            Path(f"{src_file.stem}.{aformat}")
-                        ).absolute()
-                    ).exists():
-                        break
+            # CUE sheet referenced file or the same stem
+            # in any other SoX supported file format
+            src_file = self.get_dir_index(src_file.parent).resolve(
+                src_file.name, self.config.runtime_.sox.supported_formats
+            )
 
             # nothing we can do
-            if not src_file.is_file():
+            if not src_file:
                 raise SoxcueSheetsError(
                     "Source file "
                     f"'{cue_sheet.cue_path.parent.joinpath(track.file)}' "
@@ -141,44 +310,213 @@ class SoxcueSheets:
             else:
                 track.end = 0
 
-            track.dst_path = (
-                (
-                    self.config.output_.dst_dir
-                    if self.config.output_.dst_dir
-                    else cue_sheet.cue_path.parent.joinpath("tracks")
-                )
-                .joinpath(
-                    directory_name,
-                    f"{output_filenames[idx]}.{self.config.output_.enc_format}",
-                )
-                .absolute()
-            )
+            track.outputs = [
+                TrackOutput(target=target, dst_root=dst_root, dst_path=dst_paths[idx])
+                for target, (dst_root, dst_paths) in zip(self.targets, outputs_paths)
+            ]
+            track.dst_path = track.outputs[0].dst_path
+
+            track.accuraterip = None
+            track.pcm = None
+            if pcm_pipe:
+                track.pcm = self.get_pcm_format(track.src_path)
+                if self.config.output_.checksums and track.pcm == CDDA_FORMAT:
+                    track.accuraterip = (idx == 0, idx + 1 == tracks_count)
 
             self.set_sox_cmd(track=track)
         return cue_sheet
 
+    def get_output_paths(
+        self, cue_sheet: SoxcueSheet, target: OutputTarget
+    ) -> tuple[Path, list[Path]]:
+        """
+        Output root directory and tracks paths of an output target
+        """
+        output_filenames = [
+            self.convert_spec(
+                track=track,
+                cue_sheet=cue_sheet,
+                naming_spec=target.naming_spec,
+            )
+            for track in cue_sheet.tracks
+        ]
+
+        # support 1 directory level in naming_spec
+        if len(output_filenames[0].split("/")) == 2:
+            directory_name = output_filenames[0].split("/")[0]
+            output_filenames = [x.split("/")[1] for x in output_filenames]
+        else:
+            directory_name = ""
+
+        # next to the CUE sheet, or to the archive holding it
+        dst_root = (
+            target.dst_dir
+            if target.dst_dir
+            else get_real_path(cue_sheet.cue_path).parent.joinpath(TRACKS_DIR)
+        ).absolute()
+
+        return dst_root, [
+            dst_root.joinpath(directory_name, f"{filename}.{target.enc_format}")
+            for filename in output_filenames
+        ]
+
+    def get_dir_index(self, directory: Path) -> DirIndex:
+        """
+        Cached directory listing, read once per directory
+        """
+        if directory not in self.dir_indexes:
+            self.dir_indexes[directory] = DirIndex.from_dir(directory)
+        return self.dir_indexes[directory]
+
+    def get_pcm_format(self, src_path: Path) -> dict[str, int]:
+        """
+        Source file sample rate, bits and channels
+        Read by mutagen, SoX for formats mutagen doesn't know
+        """
+        if src_path in self.pcm_formats:
+            return self.pcm_formats[src_path]
+
+        try:
+            info = probe(src_path).info
+            pcm_format = {
+                "rate": info.sample_rate,
+                "bits": getattr(info, "bits_per_sample", 16),
+                "channels": info.channels,
+            }
+        except (AttributeError, MutagenError, SoxcueArchiveError):
+            sox_info = f"{self.config.runtime_.sox.exe_name} --i"
+            try:
+                pcm_format = {
+                    k: int(
+                        run(
+                            f'{sox_info} {arg} "{src_path}"',
+                            shell=True,
+                            check=True,
+                            capture_output=True,
+                            text=True,
+                        ).stdout
+                    )
+                    for k, arg in [("rate", "-r"), ("bits", "-b"), ("channels", "-c")]
+                }
+            except (CalledProcessError, ValueError) as exc:
+                raise SoxcueSheetsError(
+                    f"Couldn't read audio properties of '{src_path}'"
+                ) from exc
+
+        # raw PCM stream sample sizes
+        if pcm_format["bits"] not in (16, 24, 32):
+            pcm_format["bits"] = 16 if pcm_format["bits"] < 16 else 32
+
+        self.pcm_formats[src_path] = pcm_format
+        return pcm_format
+
     def set_sox_cmd(
         self,
         track: TrackProperties,
     ) -> None:
         """
         Form SoX cmdline
+        Or decode/encode (and loudness meter) cmdlines piping raw PCM through soxcue
+        Whole source files already in the output format are copied
+        Simulated backend: no commands, the engine runs its cost model
         """
-        sox_cmd = [f"{self.config.runtime_.sox.exe_name} -V1"]
-
-        sox_cmd.append(f'"{track.src_path}"')
-
-        if self.config.runtime_.sox.comp_level:
-            sox_cmd.append(f"-C {self.config.runtime_.sox.comp_level}")
-
-        sox_cmd.append('--comment=""')
-
-        track_end = f" ={track.end}t" if track.end != 0 else ""
-        sox_cmd.append(f'"{track.dst_path}" trim {track.start}t{track_end}')
+        src_format = track.src_path.suffix[1:].lower()
+        stats = self.config.output_.replaygain
+        track.sox_cmd = track.decode_cmd = track.meter_cmd = None
+        if self.config.runtime_.backend == "sim":
+            track.backends = {
+                "decoder": "sim",
+                "encoders": ["sim" for _ in track.outputs],
+            }
+            return
+
+        # archive members are streamed to SoX stdin
+        archived = split_member(track.src_path) is not None
+        for output in track.outputs:
+            output.copy = (
+                not archived
+                and track.start == 0
+                and track.end == 0
+                and output.target.enc_format == src_format
+                and output.target.comp_level is None
+                and not (output.target.rate or output.target.bits)
+            )
+        decoder, _ = self.backends.select(src_format, track.outputs[0].target, stats)
+        if archived:
+            decoder = self.backends.sox
+        encoders = [
+            (
+                None
+                if output.copy
+                else self.backends.select(src_format, output.target, stats)[1]
+            )
+            for output in track.outputs
+        ]
+        sox = self.backends.sox
+        track.backends = {
+            "decoder": decoder.name,
+            "encoders": [encoder.name if encoder else "copy" for encoder in encoders],
+        }
+
+        if all(output.copy for output in track.outputs) and not (
+            self.config.output_.checksums or stats
+        ):
+            # nothing to decode
+            track.backends["decoder"] = "copy"
+            return
+
+        if (
+            len(track.outputs) > 1
+            or self.config.output_.checksums
+            or stats
+            or archived
+            or decoder is not sox
+            or encoders[0] is not sox
+        ):
+            if not track.pcm:
+                track.pcm = self.get_pcm_format(track.src_path)
+            # copied outputs: decoded for checksums/levels only
+            track.decode_cmd = (
+                f"{get_stream_cmd(track.src_path)} | "
+                + sox.decode_cmd(
+                    Path("-"), track.start, track.end, track.pcm, src_type=src_format
+                )
+                if archived
+                else decoder.decode_cmd(
+                    track.src_path, track.start, track.end, track.pcm
+                )
+            )
+            for output, encoder in zip(track.outputs, encoders):
+                output.encode_cmd = (
+                    encoder.encode_cmd(track.pcm, output.target, output.dst_path)
+                    if encoder
+                    else None
+                )
+            if stats:
+                track.meter_cmd = sox.meter_cmd(track.pcm)
+            return
+
+        track.sox_cmd = sox.convert_cmd(
+            track.src_path,
+            track.start,
+            track.end,
+            track.outputs[0].target,
+            track.dst_path,
+        )
 
-        track.sox_cmd = " ".join(x for x in sox_cmd)
+    @staticmethod
+    def get_pcm_args(pcm_format: dict[str, int]) -> str:
+        """
+        SoX raw PCM (signed little-endian) format args
+        """
+        return SoxBackend.get_pcm_args(pcm_format)
 
-    def convert_spec(self, track: TrackProperties, cue_sheet: SoxcueSheet) -> str:
+    def convert_spec(
+        self,
+        track: TrackProperties,
+        cue_sheet: SoxcueSheet,
+        naming_spec: str | None = None,
+    ) -> str:
         """
         Replace naming_spec with the appropriate CueMetaData and TrackProperties values
         Replace unsafe characters with --
@@ -187,7 +525,7 @@ class SoxcueSheets:
         def chars_re(string: str) -> str:
             return re.sub(r"[/\\?%*:|<>\x7F\x00-\x1F]", "--", string.replace('"', ""))
 
-        naming_spec = self.config.runtime_.naming_spec
+        naming_spec = naming_spec if naming_spec else self.config.runtime_.naming_spec
 
         return [
             naming_spec := naming_spec.replace(a, b)
@@ -216,37 +554,39 @@ class SoxcueSheets:
 
         return float(f"{seconds + (int(frames) * (1 / 75)):.3f}")
 
-    @staticmethod
-    def find_cue_cover(src_dir: Path) -> Iterator[dict[str, Path | None]]:
+    def find_cue_cover(
+        self,
+        src_dir: Path,
+    ) -> Iterator[dict[str, Path | DirIndex | None]]:
         """
         Search for .cue and covers in src_path
+        Keep each CUE sheet directory listing for source files lookup
         """
-        for root, _, files in os.walk(src_dir):
-            if any(Path(file).suffix.lower() == ".cue" for file in files):
+        # a single CUE sheet given, its directory only
+        src_file = (
+            None
+            if self.is_tree(self.config.input_.src_path)
+            else self.config.input_.src_path
+        )
+        walker = DirWalker(
+            audio_formats=self.config.runtime_.sox.supported_formats,
+            include=self.config.input_.include,
+            exclude=self.config.input_.exclude,
+            max_depth=0 if src_file else self.config.input_.max_depth,
+            archives=self.config.input_.archives,
+            prune=[target.dst_dir for target in self.targets if target.dst_dir],
+        )
+        for walked in walker.walk(src_dir):
+            dir_index = DirIndex.from_names(walked.directory, walked.audio)
+            for cue in walked.cues:
+                if src_file and cue != src_file.name:
+                    continue
                 yield {
-                    "cue": Path(root).joinpath(
-                        [x for x in files if Path(x).suffix.lower() == ".cue"][0]
-                    ),
+                    "cue": walked.directory.joinpath(cue),
                     "cover": (
-                        Path(root).joinpath(cover[0])
-                        if (
-                            cover := [
-                                x
-                                for x in files
-                                if Path(x).suffix.lower()
-                                in [
-                                    ".png",
-                                    ".jpg",
-                                    ".jpeg",
-                                ]
-                                and Path(x).stem.lower()
-                                in [
-                                    "cover",
-                                    "folder",
-                                    "front",
-                                ]
-                            ]
-                        )
+                        walked.directory.joinpath(walked.covers[0])
+                        if walked.covers
                         else None
                     ),
+                    "dir_index": dir_index,
                 }
@@ -0,0 +1,172 @@
+"""
+Simulated backend: load test scheduling, UI and failure handling without SoX
+python -m soxcue.simulate [-n SHEETS] [-t TRACKS] [-s SECONDS] dst_dir
+creates a library of sparse WAV sources to run soxcue -B sim on
+"""
+
+import argparse
+import hashlib
+import random
+import struct
+from pathlib import Path
+from subprocess import CalledProcessError
+from soxcue.config import SimCost
+
+# CDDA bytes per second
+CDDA_RATE = 44100 * 2 * 2
+
+# hung job: sleeps until the watchdog kills it
+HANG_SECONDS = 24 * 3600
+
+
+class SoxcueSimulateError(Exception):
+    """soxcue simulate error"""
+
+
+def wav_header(data_size: int) -> bytes:
+    """
+    CDDA WAV header
+    """
+    return (
+        b"RIFF"
+        + struct.pack("<I", 36 + data_size)
+        + b"WAVEfmt "
+        + struct.pack("<IHHIIHH", 16, 1, 2, 44100, CDDA_RATE, 4, 16)
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def flac_header() -> bytes:
+    """
+    CDDA FLAC STREAMINFO, no audio frames
+    """
+    return (
+        b"fLaC"
+        # last metadata block, STREAMINFO, 34 bytes
+        + bytes([0x80, 0, 0, 34])
+        + struct.pack(">HH", 4096, 4096)
+        + bytes(6)
+        # rate, channels - 1, bits - 1, samples count
+        + struct.pack(">Q", 44100 << 44 | 1 << 41 | 15 << 36)
+        + bytes(16)
+    )
+
+
+def mp3_frames() -> bytes:
+    """
+    Silent MPEG-1 layer III frames, 128 kbps 44.1 kHz
+    """
+    return (b"\xff\xfb\x90\x64" + bytes(413)) * 4
+
+
+# taggable empty outputs, by SIM_FORMATS
+PLACEHOLDERS = {"flac": flac_header(), "mp3": mp3_frames(), "wav": wav_header(0)}
+
+
+def simulate_process(
+    cost: SimCost,
+    length: float,
+    dst_paths: list[Path],
+    stats: bool = False,
+    checksums: bool = False,
+    timeout: float | None = None,
+) -> dict:
+    """
+    Worker function: sleep the modelled time in a watched process,
+    write placeholder outputs
+    Result has the shape of a SoX job one
+    """
+    # pylint: disable=import-outside-toplevel
+    # the engine imports this module
+    from soxcue.engine import Watchdog
+
+    rand = random.Random(f"{cost.seed}:{dst_paths[0]}")
+    seconds = max(
+        (cost.fixed + cost.per_second * length)
+        * (1 + rand.uniform(-cost.jitter, cost.jitter)),
+        0,
+    )
+    failed = rand.random() < cost.failure_rate
+    if rand.random() < cost.slow_rate:
+        seconds *= cost.slow_factor
+    # not seeded: a retry may not hang
+    if random.random() < cost.hang_rate:
+        seconds = HANG_SECONDS
+    with Watchdog(timeout) as watchdog:
+        proc = watchdog.popen(f"sleep {seconds:.3f}")
+        proc.wait()
+    if proc.returncode:
+        raise CalledProcessError(proc.returncode, f"sim '{dst_paths[0]}'")
+    if failed:
+        raise CalledProcessError(1, f"sim '{dst_paths[0]}'")
+
+    for dst_path in dst_paths:
+        dst_path.write_bytes(PLACEHOLDERS[dst_path.suffix[1:].lower()])
+    result = {}
+    if stats:
+        loudness = -rand.uniform(8, 20)
+        result["levels"] = {
+            "peak": -rand.uniform(0, 6),
+            "length": length,
+            "loudness": round(loudness, 2),
+            # every 100 ms step starts a 400 ms block
+            "blocks": [[round(loudness * 10), max(int(length * 10) - 3, 0)]],
+        }
+    if checksums:
+        result["checksums"] = {
+            "md5": hashlib.md5(str(dst_paths[0]).encode()).hexdigest(),
+            "samples": int(length * 44100),
+        }
+    return result
+
+
+def make_library(dst_dir: Path, sheets: int, tracks: int, seconds: int) -> None:
+    """
+    CUE sheets with sparse (no disk space used) silent WAV sources
+    """
+    for sheet in range(1, sheets + 1):
+        album_dir = dst_dir / f"Sim Artist - Album {sheet:05}"
+        album_dir.mkdir(parents=True, exist_ok=True)
+        lines = [
+            'PERFORMER "Sim Artist"',
+            f'TITLE "Album {sheet:05}"',
+            'FILE "album.wav" WAVE',
+        ]
+        for track in range(tracks):
+            minutes, secs = divmod(track * seconds, 60)
+            lines += [
+                f"  TRACK {track + 1:02} AUDIO",
+                f'    TITLE "Track {track + 1:02}"',
+                f"    INDEX 01 {minutes:02}:{secs:02}:00",
+            ]
+        album_dir.joinpath("album.cue").write_text(
+            "\n".join(lines) + "\n", encoding="utf-8"
+        )
+        data_size = tracks * seconds * CDDA_RATE
+        with open(album_dir / "album.wav", "wb") as fh:
+            fh.write(wav_header(data_size))
+            fh.truncate(44 + data_size)
+
+
+def main() -> None:
+    """
+    Parse cmd args, create a simulated library
+    """
+    argparser = argparse.ArgumentParser(prog="soxcue.simulate")
+    argparser.add_argument("dst_dir", type=Path)
+    argparser.add_argument(
+        "-n", "--sheets", help="CUE sheets count. Default: 100", type=int, default=100
+    )
+    argparser.add_argument(
+        "-t", "--tracks", help="tracks per sheet. Default: 12", type=int, default=12
+    )
+    argparser.add_argument(
+        "-s", "--seconds", help="track length. Default: 240", type=int, default=240
+    )
+    parsed = argparser.parse_args()
+    make_library(parsed.dst_dir, parsed.sheets, parsed.tracks, parsed.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,14 @@ from rich.panel import Panel
 from rich.text import Text
 from rich.table import Table
 from rich.columns import Columns
+from rich.console import Console
 from rich.live import Live
 from soxcue.config import Config
 from soxcue.sheets import SoxcueSheet
 
+# track statuses the engine won't change anymore
+FINAL_STATUSES = ("done", "failed")
+
 
 class SoxcueStatusError(Exception):
     """soxcue status error"""
@@ -31,7 +35,8 @@ class SoxcueRich:
         self.tracks_status = tracks_status
         self.text = self.get_general_info(cue_sheet, config)
         self.title = f"{cue_sheet.metadata.performer} - {cue_sheet.metadata.title}"
-        self.live = Live()
+        # stdout carries the tar stream
+        self.live = Live(console=Console(stderr=True) if config.output_.tar else None)
 
     def wait(self, seconds: int) -> None:
         """
@@ -52,7 +57,8 @@ class SoxcueRich:
         Keep updating status panel until all jobs are done
         """
         while not all(
-            self.tracks_status[k]["status"] == "done" for k in self.tracks_status.keys()
+            self.tracks_status[k]["status"] in FINAL_STATUSES
+            for k in self.tracks_status.keys()
         ):
             self.live.update(self._refresh_panel(), refresh=True)
             time.sleep(0.4)
@@ -106,7 +112,14 @@ class SoxcueRich:
             f"{cue_sheet.cover_path if cue_sheet.cover_path else 'not found'}\n\n"
         )
         text.append(f"Input file format: {cue_sheet.tracks[0].src_path.suffix}\n")
-        text.append(f"Output file format: {cue_sheet.tracks[0].dst_path.suffix}\n")
+        text.append(
+            "Output file format: "
+            f"{', '.join(x.dst_path.suffix for x in cue_sheet.tracks[0].outputs)}\n"
+        )
+        text.append(
+            f"Backends: {cue_sheet.tracks[0].backends['decoder']} -> "
+            f"{', '.join(cue_sheet.tracks[0].backends['encoders'])}\n"
+        )
         return text
 
 
@@ -0,0 +1,126 @@
+"""
+Content addressed store of encoded tracks
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from threading import Lock
+from soxcue.archive import open_source, source_stat
+
+# linux/fs.h
+FICLONE = 0x40049409
+CHUNK_SIZE = 1 << 20
+
+
+class SoxcueStoreError(Exception):
+    """soxcue store error"""
+
+
+def clone_file(src_path: Path, dst_path: Path) -> None:
+    """
+    Copy file: reflink (copy-on-write) where the filesystem supports it,
+    copy_file_range/sendfile copy otherwise
+    Never a hardlink, tagging would modify every link
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+
+        try:
+            while os.copy_file_range(src.fileno(), dst.fileno(), CHUNK_SIZE * 64):
+                pass
+            return
+        except OSError:
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+class ContentStore:
+    """
+    Untagged encoded tracks keyed by
+    source file hash + track sample range + encode settings
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects = root.joinpath("objects")
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.sources_path = root.joinpath("sources.json")
+        self.lock = Lock()
+        try:
+            with open(self.sources_path, encoding="utf-8") as fh:
+                self.sources: dict[str, str] = json.load(fh)
+        except (OSError, ValueError):
+            self.sources = {}
+
+    def get_source_hash(self, src_path: Path) -> str:
+        """
+        SHA-256 of the source file
+        Cached while the file is unchanged
+        """
+        stat = source_stat(src_path)
+        stat_key = (
+            f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}:{src_path}"
+        )
+        with self.lock:
+            if stat_key in self.sources:
+                return self.sources[stat_key]
+
+        sha256 = hashlib.sha256()
+        with open_source(src_path) as fh:
+            while chunk := fh.read(CHUNK_SIZE):
+                sha256.update(chunk)
+
+        with self.lock:
+            self.sources[stat_key] = sha256.hexdigest()
+            tmp_path = self.sources_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(self.sources, fh, indent=1)
+            os.replace(tmp_path, self.sources_path)
+            return self.sources[stat_key]
+
+    def get_object_path(self, source_hash: str, settings: dict) -> Path:
+        """
+        Store path of a track encoded with settings
+        settings: sample range and everything else affecting encoded audio
+        """
+        key = hashlib.sha256(
+            json.dumps([source_hash, settings], sort_keys=True).encode()
+        ).hexdigest()
+        return self.objects.joinpath(key[:2], f"{key}.{settings['enc_format']}")
+
+    @staticmethod
+    def get_result(object_path: Path) -> dict | None:
+        """
+        Stored track processing result or None if not stored
+        """
+        try:
+            with open(f"{object_path}.json", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def put(object_path: Path, dst_path: Path, result: dict) -> None:
+        """
+        Store a freshly encoded (untagged) track and its processing result
+        Result is written last, it marks the object complete
+        """
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_name(f".{object_path.name}.{os.getpid()}")
+        clone_file(dst_path, tmp_path)
+        os.replace(tmp_path, object_path)
+
+        tmp_path = Path(f"{tmp_path}.json")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(result, fh)
+        os.replace(tmp_path, f"{object_path}.json")
@@ -0,0 +1,42 @@
+"""
+Finished tracks as a tar stream
+"""
+
+import tarfile
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO
+
+
+class SoxcueStreamError(Exception):
+    """soxcue stream error"""
+
+
+class TarStream:
+    """
+    Uncompressed tar stream of finished outputs, in completion order
+    Outputs leave the scratch destination once written: a slow reader
+    blocks the engine (backpressure), bounding the scratch space used
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self.tar = tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT)
+        self.lock = Lock()
+
+    def add(self, files: list[tuple[Path, Path]]) -> None:
+        """
+        Write (path, root) files as their path relative to root, remove them
+        """
+        with self.lock:
+            for path, root in files:
+                try:
+                    self.tar.add(
+                        path, arcname=str(path.relative_to(root)), recursive=False
+                    )
+                except OSError as exc:
+                    raise SoxcueStreamError(f"Couldn't stream '{path}'") from exc
+                path.unlink()
+
+    def close(self) -> None:
+        with self.lock:
+            self.tar.close()
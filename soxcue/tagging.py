@@ -2,14 +2,22 @@
 soxcue Tagging
 """
 
+import hashlib
+import json
 import re
 from pathlib import Path
 from mediafile import MediaFile, Image, ImageType
+from soxcue.archive import read_source
 from soxcue.config import Config
+from soxcue.loudness import get_histogram_loudness
 from soxcue.sheets import SoxcueSheet
 from soxcue.parser import TrackProperties
 
 
+# ReplayGain 2.0 reference loudness, LUFS
+RG_REFERENCE = -18.0
+
+
 class SoxcueTaggingError(Exception):
     """soxcue tagging error"""
 
@@ -52,12 +60,12 @@ class Tags:
         )
 
         if cue_sheet.cover_path:
-            with open(cue_sheet.cover_path, "rb") as fh:
-                self.sheet_tags["cover"] = Image(
-                    data=fh.read(),
-                    desc="album cover",
-                    type=ImageType.front,
-                )
+            # in memory, covers in archives aren't extracted
+            self.sheet_tags["cover"] = Image(
+                data=read_source(cue_sheet.cover_path),
+                desc="album cover",
+                type=ImageType.front,
+            )
         else:
             self.sheet_tags["cover"] = None
 
@@ -95,14 +103,47 @@ class Tags:
         tags["images"] = [self.sheet_tags["cover"]] if self.sheet_tags["cover"] else []
         tags["comments"] = self.sheet_tags["comments"]
 
-        return {"tags": tags, "path": track.dst_path}
+        return {"tags": tags, "paths": [output.dst_path for output in track.outputs]}
+
+    @staticmethod
+    def get_tags_key(tags: dict) -> str:
+        """
+        Track tags digest, images by their content
+        """
+        return hashlib.sha1(
+            json.dumps(
+                tags,
+                sort_keys=True,
+                default=lambda image: hashlib.sha1(image.data).hexdigest(),
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def get_gain_tags(levels: list[dict], album: bool = False) -> dict:
+        """
+        Prepare ReplayGain 2.0 tags from a track (or all album tracks) levels
+        levels: {"peak": dBFS, "loudness": LUFS, "blocks": histogram, ...}
+        Album loudness gates the blocks of all tracks together (BS.1770)
+        """
+        loudness = (
+            get_histogram_loudness([x["blocks"] for x in levels])
+            if album
+            else levels[0]["loudness"]
+        )
+        prefix = "rg_album" if album else "rg_track"
+
+        return {
+            f"{prefix}_gain": round(RG_REFERENCE - loudness, 2),
+            f"{prefix}_peak": round(max(10 ** (x["peak"] / 20) for x in levels), 6),
+        }
 
     @staticmethod
-    def write_tags(tags: dict[str, dict | Path]) -> None:
+    def write_tags(tags: dict[str, dict | list[Path]]) -> None:
         """
-        Write file tags
+        Write file tags to every track output
         """
-        file_tags = MediaFile(tags["path"])
-        for k, v in tags["tags"].items():
-            setattr(file_tags, k, v)
-        file_tags.save()
+        for path in tags["paths"]:
+            file_tags = MediaFile(path)
+            for k, v in tags["tags"].items():
+                setattr(file_tags, k, v)
+            file_tags.save()
@@ -0,0 +1,104 @@
+"""
+Verify produced tracks against manifest checksums
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from subprocess import Popen, PIPE, DEVNULL
+from rich.console import Console
+from rich.table import Table
+from soxcue.checksums import PcmChecksums
+from soxcue.config import Config
+from soxcue.manifest import Manifest
+from soxcue.sheets import SoxcueSheets
+
+
+class SoxcueVerifyError(Exception):
+    """soxcue verify error"""
+
+
+class SoxcueVerify:  # pylint: disable=too-few-public-methods
+    """
+    Decode every track recorded in manifests found in the output tree
+    Compare PCM checksums
+    """
+
+    def __init__(self, config: Config, console: Console):
+        self.config = config
+        self.console = console
+
+    def verify(self) -> int:
+        """
+        Verify all tracks in parallel
+        Return failures count
+        """
+        src_dirs = [
+            (
+                self.config.output_.dst_dir
+                if self.config.output_.dst_dir
+                else (
+                    self.config.input_.src_path
+                    if self.config.input_.src_path.is_dir()
+                    else self.config.input_.src_path.parent
+                )
+            )
+        ] + [target.dst_dir for target in self.config.output_.targets if target.dst_dir]
+
+        table = Table("File", "Status")
+        failures = 0
+        with ProcessPoolExecutor(max(os.cpu_count() - 1, 1)) as ex:
+            futures = {
+                ex.submit(
+                    self._verify_track,
+                    dst_path,
+                    (
+                        f'{self.config.runtime_.sox.exe_name} -V1 "{dst_path}" '
+                        f"{SoxcueSheets.get_pcm_args(record['pcm'])} -"
+                    ),
+                    record,
+                ): dst_path
+                for src_dir in dict.fromkeys(src_dirs)
+                for manifest in Manifest.find(src_dir)
+                for dst_path, record in (
+                    (manifest.get_path(k), v)
+                    for k, v in manifest.records.items()
+                    if "md5" in v
+                )
+            }
+
+            for future in as_completed(futures):
+                if future.exception():
+                    status = f"[red]{future.exception()}"
+                elif future.result():
+                    status = "[red]mismatch: " + ", ".join(future.result())
+                else:
+                    status = "[green]ok"
+                failures += status != "[green]ok"
+                table.add_row(str(futures[future]), status)
+
+        self.console.print(table)
+        return failures
+
+    @staticmethod
+    def _verify_track(dst_path: Path, decode_cmd: str, record: dict) -> list[str]:
+        """
+        Decode track and compare its checksums with the record
+        Return mismatching checksum names
+        """
+        if not dst_path.is_file():
+            raise SoxcueVerifyError("missing")
+
+        checksums = PcmChecksums(
+            accuraterip=tuple(record["accuraterip"]) if record["accuraterip"] else None
+        )
+        with Popen(decode_cmd, shell=True, stdout=PIPE, stderr=DEVNULL) as decoder:
+            while chunk := decoder.stdout.read(1 << 20):
+                checksums.update(chunk)
+        if decoder.returncode:
+            raise SoxcueVerifyError(f"decoder exited with {decoder.returncode}")
+
+        result = checksums.result(
+            sample_size=record["pcm"]["bits"] // 8 * record["pcm"]["channels"]
+        )
+        return [k for k, v in result.items() if record.get(k) != v]
@@ -0,0 +1,208 @@
+"""
+Source tree discovery
+"""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from fnmatch import translate
+from pathlib import Path
+from soxcue.archive import SoxcueArchiveError, is_archive, is_archive_name, list_members
+from soxcue.manifest import MANIFEST_DIR
+
+COVER_STEMS = ["cover", "folder", "front"]
+COVER_FORMATS = ["png", "jpg", "jpeg"]
+# default output directory name, next to the CUE sheet
+TRACKS_DIR = "tracks"
+
+
+class SoxcueWalkerError(Exception):
+    """soxcue walker error"""
+
+
+@dataclass
+class WalkedDir:
+    """
+    Single directory listing
+    files classified by their (lowercase) suffix
+    """
+
+    directory: Path
+    cues: list[str] = field(default_factory=list)
+    covers: list[str] = field(default_factory=list)
+    audio: list[str] = field(default_factory=list)
+
+
+class DirWalker:  # pylint: disable=too-few-public-methods
+    """
+    Multi-threaded scandir based walker
+    Prunes excluded and soxcue output directories
+    Looks inside zip/tar archives if asked to
+    """
+
+    def __init__(
+        self,
+        audio_formats: list[str],
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        max_depth: int | None = None,
+        prune: list[Path] | None = None,
+        archives: bool = False,
+        max_workers: int = 8,
+    ):
+        """
+        include: CUE sheet path globs (relative to the walked root or a name)
+        exclude: directory/CUE sheet path globs
+        max_depth: directory levels below the root, None is unlimited
+        prune: directories never entered (e.g. output directories)
+        archives: walk archives found below the root (a root archive always is)
+        """
+        self.audio_formats = set(audio_formats)
+        self.include = self._compile(include)
+        self.exclude = self._compile(exclude)
+        self.max_depth = max_depth
+        self.prune = {path.absolute() for path in prune} if prune else set()
+        self.archives = archives
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _compile(patterns: list[str] | None) -> re.Pattern | None:
+        """
+        Single regex matching any of the globs
+        """
+        if not patterns:
+            return None
+        return re.compile("|".join(translate(pattern) for pattern in patterns))
+
+    @staticmethod
+    def _matches(pattern: re.Pattern | None, rel_path: str, name: str) -> bool:
+        return pattern is not None and bool(
+            pattern.match(rel_path) or pattern.match(name)
+        )
+
+    def walk(self, root: Path) -> list[WalkedDir]:
+        """
+        Directories with CUE sheets below root, sorted by path
+        Directories are listed in parallel (network filesystems latency)
+        Archives are walked like directories, root can be one
+        """
+        root = root.absolute()
+        if is_archive(root):
+            return sorted(
+                [x for x in self._scan_archive(root, root.name) if x.cues],
+                key=lambda x: x.directory,
+            )
+
+        found = []
+        with ThreadPoolExecutor(self.max_workers) as ex:
+            pending = {ex.submit(self._scan, root, root, 0)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    walked_dirs, subdirs, depth = future.result()
+                    found.extend(x for x in walked_dirs if x.cues)
+                    pending.update(
+                        ex.submit(self._scan, root, subdir, depth + 1)
+                        for subdir in subdirs
+                    )
+
+        return sorted(found, key=lambda x: x.directory)
+
+    def _classify(self, walked: WalkedDir, name: str, rel_path: str) -> bool:
+        """
+        Add a file to the listing, True for a CUE sheet (included or not)
+        """
+        stem, suffix = os.path.splitext(name)
+        suffix = suffix[1:].lower()
+        if suffix == "cue":
+            if not self._matches(self.exclude, rel_path, name) and (
+                self.include is None or self._matches(self.include, rel_path, name)
+            ):
+                walked.cues.append(name)
+        elif suffix in COVER_FORMATS and stem.lower() in COVER_STEMS:
+            walked.covers.append(name)
+        if suffix in self.audio_formats:
+            walked.audio.append(name)
+        return suffix == "cue"
+
+    def _scan_archive(self, archive: Path, rel_path: str) -> list[WalkedDir]:
+        """
+        Archive members listing, one WalkedDir per directory inside it
+        Unreadable archives are skipped
+        """
+        try:
+            members = list_members(archive)
+        except SoxcueArchiveError:
+            return []
+
+        walked_dirs: dict[str, WalkedDir] = {}
+        for member in members:
+            member_dir, _, name = member.rpartition("/")
+            if member_dir not in walked_dirs:
+                walked_dirs[member_dir] = WalkedDir(
+                    directory=archive.joinpath(member_dir)
+                )
+            self._classify(walked_dirs[member_dir], name, f"{rel_path}/{member}")
+
+        for walked in walked_dirs.values():
+            walked.cues.sort()
+            walked.covers.sort()
+        return list(walked_dirs.values())
+
+    def _scan(
+        self, root: Path, directory: Path, depth: int
+    ) -> tuple[list[WalkedDir], list[Path], int]:
+        """
+        One directory read: classify files, list archives,
+        pick subdirectories to descend into
+        """
+        walked = WalkedDir(directory=directory)
+        archived: list[WalkedDir] = []
+        subdirs = []
+        has_cue = False
+        rel_dir = "" if directory == root else f"{directory.relative_to(root)}/"
+        try:
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError:
+            return [walked], subdirs, depth
+
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                subdirs.append(entry.name)
+                continue
+
+            rel_path = f"{rel_dir}{entry.name}"
+            if self.archives and is_archive_name(entry.name):
+                if not self._matches(self.exclude, rel_path, entry.name):
+                    archived += self._scan_archive(directory / entry.name, rel_path)
+                    # archived CUE sheets output next to the archive too
+                    has_cue |= any(x.cues for x in archived)
+                continue
+            has_cue |= self._classify(walked, entry.name, rel_path)
+
+        walked.cues.sort()
+        walked.covers.sort()
+        if self.max_depth is not None and depth >= self.max_depth:
+            return [walked, *archived], [], depth
+
+        return (
+            [walked, *archived],
+            [
+                directory.joinpath(name)
+                for name in subdirs
+                if not (
+                    name == MANIFEST_DIR
+                    # default output directory of the CUE sheets found here
+                    or (name == TRACKS_DIR and has_cue)
+                    or directory.joinpath(name) in self.prune
+                    or self._matches(self.exclude, f"{rel_dir}{name}", name)
+                )
+            ],
+            depth,
+        )
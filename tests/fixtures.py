@@ -2,6 +2,7 @@ import json
 import pytest
 from pathlib import Path
 from soxcue.parser import CueMetaData, TrackProperties, CueParser
+from soxcue.config import PRESETS, Preset
 from soxcue.sheets import SoxcueSheets
 
 def get_test_cue_sheet_path() -> str:
@@ -17,11 +18,19 @@ class SoxProperties:
 
 class ConfigInput:
     src_path: Path = Path(get_test_cue_sheet_path())
+    include: list = []
+    exclude: list = []
+    max_depth: None = None
+    archives: bool = False
 
 class ConfigOutput:
     dst_dir: None = None
     cmd_comment: None = None
     enc_format: str = "flac"
+    replaygain: bool = False
+    checksums: bool = False
+    targets: list = []
+    main_target: None = None
 
     def get_comments_dict(self):
         return {}
@@ -31,6 +40,8 @@ class ConfigRuntime:
     time_wait: int = 5
     naming_spec: str = "#c - #d - #a/#n - #p - #t"
     sox: SoxProperties = SoxProperties()
+    preset: Preset = PRESETS["balanced"]
+    backend: str = "sox"
 
 class Config:
     input_: ConfigInput = ConfigInput()
@@ -0,0 +1,82 @@
+import subprocess
+import tarfile
+import zipfile
+import pytest
+from soxcue.archive import (
+    SoxcueArchiveError,
+    get_stream_cmd,
+    list_members,
+    read_source,
+    source_size,
+    split_member,
+)
+from soxcue.parser import CueParser
+from soxcue.walker import DirWalker
+
+
+def test_archive_walk(tmp_path):
+    cue = b'TITLE "Album"\r\nFILE "album.flac" WAVE\r\n  TRACK 01 AUDIO\r\n'
+    with zipfile.ZipFile(tmp_path / "a.zip", "w") as zfh:
+        zfh.writestr("Album/album.cue", cue)
+        zfh.writestr("Album/album.flac", b"flac", compress_type=zipfile.ZIP_STORED)
+        zfh.writestr("Album/Cover.jpg", b"jpeg", compress_type=zipfile.ZIP_DEFLATED)
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b/album.cue").write_bytes(cue)
+    with tarfile.open(tmp_path / "b/b.tar", "w") as tfh:
+        tfh.add(tmp_path / "b/album.cue", arcname="./album.cue")
+
+    found = DirWalker(audio_formats=["flac"]).walk(tmp_path)
+    assert [x.directory for x in found] == [tmp_path / "b"]
+    found = DirWalker(audio_formats=["flac"], archives=True).walk(tmp_path)
+    assert [x.directory for x in found] == [
+        tmp_path / "a.zip/Album",
+        tmp_path / "b",
+        tmp_path / "b/b.tar",
+    ]
+    assert found[0].cues == ["album.cue"]
+    assert found[0].covers == ["Cover.jpg"]
+    assert found[0].audio == ["album.flac"]
+
+    member = tmp_path / "a.zip/Album/album.flac"
+    assert split_member(member) == (tmp_path / "a.zip", "Album/album.flac")
+    assert split_member(tmp_path / "b/album.cue") is None
+    assert read_source(member) == b"flac"
+    stream_cmd = get_stream_cmd(member)
+    assert stream_cmd.endswith(" 4")
+    assert subprocess.run(stream_cmd, shell=True, capture_output=True).stdout == b"flac"
+    assert source_size(member) == 4
+    assert read_source(tmp_path / "a.zip/Album/Cover.jpg") == b"jpeg"
+    assert read_source(tmp_path / "b/b.tar/album.cue") == cue
+
+    metadata, tracks = CueParser.from_bytes(
+        read_source(found[0].directory / "album.cue")
+    )
+    assert metadata.title == "Album"
+    assert tracks[0].file == "album.flac"
+
+
+def test_archive_unreadable_members(tmp_path):
+    cue = b'TITLE "Album"\r\nFILE "album.flac" WAVE\r\n  TRACK 01 AUDIO\r\n'
+    with zipfile.ZipFile(tmp_path / "a.zip", "w") as zfh:
+        zfh.writestr("Album/album.cue", cue)
+        zfh.writestr("Album/album.flac", b"flac")
+    # CUE sheet flagged encrypted in its local and central directory headers
+    data = bytearray((tmp_path / "a.zip").read_bytes())
+    data[6] |= 0x1
+    data[data.index(b"PK\x01\x02") + 8] |= 0x1
+    (tmp_path / "a.zip").write_bytes(bytes(data))
+    with zipfile.ZipFile(tmp_path / "b.zip", "w") as zfh:
+        zfh.writestr("Album/album.cue", cue, compress_type=zipfile.ZIP_DEFLATED)
+        zfh.writestr("Album/album.flac", b"flac")
+    # damaged deflate stream
+    data = bytearray((tmp_path / "b.zip").read_bytes())
+    data[data.index(b"Album/album.cue") + 15] ^= 0xFF
+    (tmp_path / "b.zip").write_bytes(bytes(data))
+
+    found = DirWalker(audio_formats=["flac"], archives=True).walk(tmp_path)
+    assert [x.directory for x in found] == [tmp_path / "b.zip/Album"]
+    assert list_members(tmp_path / "a.zip") == ["Album/album.flac"]
+    with pytest.raises(SoxcueArchiveError):
+        read_source(tmp_path / "a.zip/Album/album.cue")
+    with pytest.raises(SoxcueArchiveError):
+        read_source(tmp_path / "b.zip/Album/album.cue")
@@ -0,0 +1,35 @@
+from pathlib import Path
+import pytest
+from soxcue.backends import Backend, BackendSelector, FfmpegBackend, FlacBackend
+from soxcue.config import OutputTarget
+from .fixtures import get_config
+
+PCM = {"rate": 44100, "bits": 16, "channels": 2}
+
+
+def test_flac_decode_range():
+    assert FlacBackend().decode_cmd(Path("/a.flac"), 1.5, 3.0, PCM) == (
+        "flac -d -s -c --force-raw-format --endian=little --sign=signed "
+        '--skip=66150 --until=132300 "/a.flac"'
+    )
+
+
+def test_sox_only_selection():
+    selector = BackendSelector(get_config(), backend="sox")
+    decoder, encoder = selector.select("flac", OutputTarget(enc_format="flac"), False)
+    assert decoder is encoder is selector.sox
+
+
+def test_encode_settings():
+    with pytest.raises(TypeError):
+        Backend()
+    ffmpeg = FfmpegBackend()
+    assert ffmpeg.can_encode(OutputTarget(enc_format="mp3"))
+    assert ffmpeg.can_encode(OutputTarget(enc_format="flac", comp_level=8))
+    assert not ffmpeg.can_encode(OutputTarget(enc_format="mp3", comp_level=320))
+    assert not ffmpeg.can_encode(OutputTarget(enc_format="flac", rate=48000))
+
+    selector = BackendSelector(get_config(), backend="sox")
+    assert selector.get_pair_key(
+        "flac", OutputTarget(enc_format="mp3", comp_level=128)
+    ) != selector.get_pair_key("flac", OutputTarget(enc_format="mp3", comp_level=320))
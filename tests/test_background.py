@@ -0,0 +1,58 @@
+import os
+from subprocess import PIPE
+from soxcue.background import (
+    PressureThrottle,
+    background_call,
+    get_run_delay,
+    is_background,
+)
+from soxcue.engine import Watchdog
+
+
+def test_pressure_throttle(tmp_path):
+    def set_pressure(cpu, io):
+        for resource, value in [("cpu", cpu), ("io", io)]:
+            tmp_path.joinpath(resource).write_text(
+                f"some avg10={value:.2f} avg60=0.00 avg300=0.00 total=0\n"
+                "full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n",
+                encoding="utf-8",
+            )
+
+    throttle = PressureThrottle(threshold=10.0, interval=0, psi_dir=tmp_path)
+    set_pressure(1.0, 30.0)
+    assert [throttle.get_limit(4) for _ in range(5)] == [3, 2, 1, 1, 1]
+    set_pressure(7.0, 1.0)
+    assert throttle.get_limit(4) == 1
+    set_pressure(1.0, 1.0)
+    assert [throttle.get_limit(4) for _ in range(4)] == [2, 3, 4, 4]
+
+    assert PressureThrottle(psi_dir=tmp_path / "none").get_limit(4) == 4
+
+
+def test_run_delay(tmp_path):
+    for pid, pgrp, delay in [(10, 7, 2), (11, 7, 3), (12, 8, 9)]:
+        tmp_path.joinpath(str(pid)).mkdir()
+        tmp_path.joinpath(f"{pid}/stat").write_text(
+            f"{pid} (sox (x) 1) S 1 {pgrp} {pgrp} 0", encoding="utf-8"
+        )
+        tmp_path.joinpath(f"{pid}/schedstat").write_text(
+            f"100 {delay * 10**9} 4", encoding="utf-8"
+        )
+    tmp_path.joinpath("self").mkdir()
+    assert get_run_delay({7}, proc_dir=tmp_path) == 3.0
+    assert get_run_delay({9}, proc_dir=tmp_path) == 0.0
+
+
+def test_background_call():
+    def job() -> str:
+        with Watchdog(None) as watchdog:
+            # nice value of the job process
+            proc = watchdog.popen("cut -d ' ' -f 19 /proc/self/stat", stdout=PIPE)
+            return proc.communicate()[0].decode().strip()
+
+    nice = os.getpriority(os.PRIO_PROCESS, 0)
+    assert background_call(job, ()) == "19"
+    # the worker and its later foreground jobs keep their priority
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice
+    assert not is_background()
+    assert job() == str(nice)
@@ -0,0 +1,43 @@
+import hashlib
+import random
+from array import array
+from soxcue.checksums import AR_SKIP, MASK32, PcmChecksums
+
+
+def get_crcs(data: bytes, first: bool, last: bool) -> dict[str, str]:
+    """
+    Whole track AccurateRip CRCs, one sample at a time
+    """
+    samples = array("I", data)
+    arv1 = arv2 = 0
+    for position, sample in enumerate(samples, 1):
+        if (first and position < AR_SKIP - 1) or (
+            last and position > len(samples) - AR_SKIP
+        ):
+            continue
+        arv1 += sample * position
+        arv2 += (sample * position & MASK32) + (sample * position >> 32)
+    return {"arv1": f"{arv1 & MASK32:08x}", "arv2": f"{arv2 & MASK32:08x}"}
+
+
+def test_chunked_checksums():
+    data = random.Random(0).randbytes((AR_SKIP * 3 + 5) * 4)
+    for accuraterip in [(False, False), (True, False), (False, True), (True, True)]:
+        expected = {
+            "md5": hashlib.md5(data).hexdigest(),
+            "samples": len(data) // 4,
+            **get_crcs(data, *accuraterip),
+        }
+        # chunks splitting samples, skipped and held back ranges
+        for chunk_size in [1, 3, 4099, AR_SKIP * 4 - 2, len(data)]:
+            checksums = PcmChecksums(accuraterip=accuraterip)
+            for offset in range(0, len(data), chunk_size):
+                checksums.update(data[offset : offset + chunk_size])
+            assert checksums.result(sample_size=4) == expected
+
+
+def test_track_shorter_than_skip():
+    data = bytes(range(256)) * 4
+    checksums = PcmChecksums(accuraterip=(True, True))
+    checksums.update(data)
+    assert checksums.result(sample_size=4)["arv1"] == "00000000"
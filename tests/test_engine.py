@@ -0,0 +1,195 @@
+import time
+import pytest
+from mediafile import Image, ImageType, MediaFile
+from soxcue import engine as soxcue_engine
+from soxcue.config import (
+    Config,
+    ConfigInput,
+    ConfigOutput,
+    ConfigRuntime,
+    SimCost,
+    SoxProperties,
+)
+from soxcue.engine import (
+    SoxcueEngine,
+    SoxcueEngineError,
+    SoxcueTimeoutError,
+    Watchdog,
+)
+from soxcue.journal import Journal
+from soxcue.sheets import SoxcueSheets, SoxcueSheetsError
+from soxcue.simulate import PLACEHOLDERS, make_library
+
+
+def get_sim_config(
+    src_path, dst_dir, naming_spec: str = "#a/#n", force: bool = False
+) -> Config:
+    return Config(
+        input_=ConfigInput(src_path=src_path),
+        output_=ConfigOutput(
+            dst_dir=dst_dir, cmd_comment=None, enc_format="wav", force=force
+        ),
+        runtime_=ConfigRuntime(
+            cue_encoding="utf-8",
+            time_wait=0,
+            naming_spec=naming_spec,
+            sox=SoxProperties(exe_name=None, comp_level=None),
+            backend="sim",
+            sim_cost=SimCost(fixed=0, per_second=0),
+        ),
+    )
+
+
+def test_sox_process_keeps_stdout_clean(capfd):
+    SoxcueEngine._sox_process("echo out; echo err >&2")
+    SoxcueEngine._pcm_process(
+        "printf pcm; echo err >&2", ["cat; echo out"], {"bits": 16, "channels": 2}, None
+    )
+    assert capfd.readouterr().out == ""
+
+
+def test_abort_under_lock(tmp_path):
+    path = tmp_path / "01.flac"
+    path.touch()
+    journal = Journal(tmp_path / "sheet.journal")
+    journal.set_state("01", "encoding", paths=[str(path)])
+    with SoxcueEngine(max_workers=1) as engine:
+        engine.journals.add(journal)
+        # a signal handler interrupting a length probe / journal write
+        with engine.lock, journal.lock:
+            engine.abort()
+    assert not path.exists()
+
+
+def test_timeout_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(soxcue_engine, "RETRY_BACKOFF", 0)
+    runs = tmp_path / "runs"
+    started = time.monotonic()
+    with pytest.raises(SoxcueTimeoutError):
+        SoxcueEngine._retry_process(
+            2, SoxcueEngine._sox_process, (f"echo >> {runs}; sleep 10", 0.2)
+        )
+    # process groups killed, not waited for
+    assert time.monotonic() - started < 5
+    assert len(runs.read_text().splitlines()) == 3
+
+
+def test_background_timeout(monkeypatch):
+    # waited 1s for a CPU by the first deadline, not since
+    monkeypatch.setattr(soxcue_engine, "is_background", lambda: True)
+    monkeypatch.setattr(soxcue_engine, "get_run_delay", lambda pgids: 1.0)
+    started = time.monotonic()
+    with pytest.raises(SoxcueTimeoutError):
+        with Watchdog(0.2) as watchdog:
+            watchdog.popen("sleep 10").wait()
+    assert 1.1 < time.monotonic() - started < 5
+
+
+def test_sheet_isolation(tmp_path):
+    make_library(tmp_path / "src", sheets=3, tracks=2, seconds=1)
+    albums = sorted((tmp_path / "src").iterdir())
+    # unreadable source: its tracks fail
+    albums[1].joinpath("album.wav").write_bytes(b"not audio")
+    # missing source: the sheet can't be planned
+    albums[2].joinpath("album.wav").unlink()
+
+    config = get_sim_config(tmp_path / "src", tmp_path / "dst")
+    sheets = SoxcueSheets(config=config)
+    assert list(sheets.failed) == [albums[2] / "album.cue"]
+    with SoxcueEngine(max_workers=2) as engine:
+        engine.process_sheet(sheets.cue_sheets[0], config)
+        with pytest.raises(SoxcueEngineError, match="2 of 2 track"):
+            engine.process_sheet(sheets.cue_sheets[1], config)
+    assert len(list(tmp_path.glob("dst/Album 00001/*.wav"))) == 2
+    assert not list(tmp_path.glob("dst/Album 00002/*.wav"))
+
+
+def test_copy_process(tmp_path):
+    src_path = tmp_path / "src.flac"
+    src_path.write_bytes(PLACEHOLDERS["flac"])
+    tags = MediaFile(src_path)
+    tags.title = "Source"
+    tags.images = [Image(data=b"\x89PNG\r\n\x1a\n", type=ImageType.front)]
+    tags.save()
+
+    dst_path = tmp_path / "dst.flac"
+    assert SoxcueEngine._copy_process([(src_path, dst_path)], None, ()) == {}
+    assert MediaFile(dst_path).title is None
+    assert not MediaFile(dst_path).images
+    assert MediaFile(src_path).title == "Source"
+
+
+def test_rename_retag(tmp_path):
+    make_library(tmp_path / "src", sheets=1, tracks=2, seconds=1)
+    cue_path = next(tmp_path.glob("src/*/album.cue"))
+    dst_dir = tmp_path / "dst/Album 00001"
+
+    def process(force: bool = False) -> list[str]:
+        statuses = []
+        config = get_sim_config(tmp_path / "src", tmp_path / "dst", "#a/#t", force)
+        with SoxcueEngine(max_workers=2) as engine:
+            engine.process_sheet(
+                SoxcueSheets(config=config).cue_sheets[0],
+                config,
+                progress=lambda sheet, track, status: statuses.append(status),
+            )
+        return statuses
+
+    assert "sox" in process()
+    inodes = {path.name: path.stat().st_ino for path in dst_dir.glob("*.wav")}
+    assert set(inodes) == {"Track 01.wav", "Track 02.wav"}
+
+    # swapped titles: outputs swap names through temporary ones, no re-encode
+    cue = cue_path.read_text(encoding="utf-8")
+    cue_path.write_text(
+        cue.replace("Track 01", "Track X")
+        .replace("Track 02", "Track 01")
+        .replace("Track X", "Track 02"),
+        encoding="utf-8",
+    )
+    statuses = process()
+    assert "sox" not in statuses and statuses.count("retagging") == 2
+    assert dst_dir.joinpath("Track 01.wav").stat().st_ino == inodes["Track 02.wav"]
+    assert dst_dir.joinpath("Track 02.wav").stat().st_ino == inodes["Track 01.wav"]
+    assert MediaFile(dst_dir / "Track 01.wav").title == "Track 01"
+    assert sorted(x.name for x in dst_dir.iterdir() if x.is_file()) == [
+        "Track 01.wav",
+        "Track 02.wav",
+    ]
+
+    # unchanged: nothing to do
+    assert not {"retagging", "sox"} & set(process())
+    assert process(force=True).count("sox") == 2
+
+
+def test_submit(tmp_path):
+    make_library(tmp_path / "src", sheets=3, tracks=2, seconds=1)
+    albums = sorted((tmp_path / "src").iterdir())
+    albums[1].joinpath("album.wav").write_bytes(b"not audio")
+    albums[2].joinpath("album.wav").unlink()
+    statuses = []
+
+    config = get_sim_config(tmp_path / "src", tmp_path / "dst")
+    with SoxcueEngine(max_workers=2, max_sheets=2) as engine:
+        sheet_jobs = engine.submit(
+            config,
+            progress=lambda sheet, track, status: statuses.append(
+                (sheet.cue_path.parent.name, track.index, status)
+            ),
+        )
+        # couldn't be planned: first, no tracks
+        assert sheet_jobs[0].cue_sheet.cue_path == albums[2] / "album.cue"
+        assert not sheet_jobs[0].tracks
+        assert isinstance(sheet_jobs[0].future.exception(), SoxcueSheetsError)
+
+        assert sheet_jobs[1].future.result() is sheet_jobs[1].cue_sheet
+        tracks = [future.result() for future in sheet_jobs[1].tracks.values()]
+        assert [track.index for track in tracks] == ["01", "02"]
+        assert all(track.dst_path.is_file() for track in tracks)
+
+        assert isinstance(sheet_jobs[2].future.exception(), SoxcueEngineError)
+        assert all(future.exception() for future in sheet_jobs[2].tracks.values())
+
+    assert (albums[0].name, "01", "sox") in statuses
+    assert (albums[0].name, "01", "done") in statuses
+    assert (albums[1].name, "02", "failed") in statuses
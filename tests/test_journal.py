@@ -0,0 +1,30 @@
+from soxcue.journal import Journal
+
+
+def test_journal(tmp_path):
+    paths = {key: tmp_path / f"{key}.flac" for key in ["01", "02", "03"]}
+    for path in paths.values():
+        path.touch()
+    journal = Journal(tmp_path / "sheet.journal")
+    for key, path in paths.items():
+        journal.set_state(key, "planned", paths=[str(path)])
+    journal.set_state("01", "published")
+    journal.set_state("02", "encoded", result={"checksums": {}})
+    journal.close()
+    with open(tmp_path / "sheet.journal", "a", encoding="utf-8") as fh:
+        fh.write('{"track": "03", "sta')
+
+    journal = Journal(tmp_path / "sheet.journal")
+    assert journal.load()["02"] == {
+        "track": "02",
+        "state": "encoded",
+        "paths": [str(paths["02"])],
+        "result": {"checksums": {}},
+    }
+    assert journal.get_state("03") == "planned"
+    journal.discard_partial(keep_encoded=True)
+    assert [path.exists() for path in paths.values()] == [True, True, False]
+    journal.discard_partial()
+    assert [path.exists() for path in paths.values()] == [True, False, False]
+    journal.remove()
+    assert not (tmp_path / "sheet.journal").exists()
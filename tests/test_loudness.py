@@ -0,0 +1,41 @@
+import math
+from array import array
+from soxcue.loudness import ABSOLUTE_GATE, METER_VOLUME, LoudnessMeter, get_filters
+
+
+def get_sine(seconds: float, amplitude: float, rate: int = 48000) -> bytes:
+    # stereo, as SoX meter_cmd outputs it (attenuated)
+    samples = array(
+        "f",
+        [
+            amplitude * METER_VOLUME * math.sin(2 * math.pi * 997 * (idx // 2) / rate)
+            for idx in range(int(seconds * rate) * 2)
+        ],
+    )
+    return samples.tobytes()
+
+
+def test_filters():
+    # libebur128 / BS.1770 48 kHz coefficients
+    shelf, highpass = get_filters(48000)
+    expected = [1.53512486, -2.69169619, 1.19839281, 1, -1.69065929, 0.73248077]
+    assert all(math.isclose(x, y, abs_tol=1e-6) for x, y in zip(shelf, expected))
+    assert math.isclose(highpass[4], -1.99004745, abs_tol=1e-6)
+    assert math.isclose(highpass[5], 0.99007225, abs_tol=1e-6)
+
+
+def test_meter():
+    meter = LoudnessMeter(48000, 2)
+    data = get_sine(3, 0.5) + get_sine(0.5, 0.01)
+    # chunks split mid sample and mid step
+    for idx in range(0, len(data), 12345):
+        meter.update(data[idx : idx + 12345])
+    result = meter.result()
+    # 2 channels mean square 0.125 each, quiet end gated
+    # 27 loud blocks, 3 partly loud ones (3/4, 2/4, 1/4) at the transition
+    assert result["loudness"] == round(-0.691 + 10 * math.log10(0.25 * 28.5 / 30), 2)
+    assert [-67, 27] in result["blocks"]
+
+    silence = LoudnessMeter(48000, 2)
+    silence.update(bytes(48000 * 8))
+    assert silence.result() == {"loudness": ABSOLUTE_GATE, "blocks": []}
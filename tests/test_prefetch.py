@@ -0,0 +1,68 @@
+import time
+from soxcue.prefetch import Prefetcher
+from soxcue.schedule import DeviceScheduler
+
+
+def make_files(tmp_path, sizes: dict[str, int]) -> dict:
+    paths = {}
+    for name, size in sizes.items():
+        paths[name] = tmp_path / name
+        paths[name].write_bytes(bytes(size))
+    return paths
+
+
+def test_budget_eviction(tmp_path):
+    paths = make_files(tmp_path, {"a": 40, "b": 40, "c": 40, "d": 200})
+    prefetcher = Prefetcher(budget=100)
+    prefetcher._prefetch(paths["a"])
+    prefetcher._prefetch(paths["b"])
+    # a used again: b is the least recently used
+    prefetcher._prefetch(paths["a"])
+    prefetcher._prefetch(paths["c"])
+    assert list(prefetcher.cached) == [paths["a"], paths["c"]]
+    # larger than the budget: only its beginning
+    prefetcher._prefetch(paths["d"])
+    assert prefetcher.cached == {paths["d"]: 100}
+    prefetcher.close()
+
+
+def test_pinning(tmp_path):
+    paths = make_files(tmp_path, {"a": 60, "b": 60})
+    prefetcher = Prefetcher(budget=100)
+    prefetcher._prefetch(paths["a"])
+    # read by two sheets
+    prefetcher.pin([paths["a"]])
+    prefetcher.pin([paths["a"], paths["a"]])
+    prefetcher._prefetch(paths["b"])
+    # only what's left of the budget
+    assert prefetcher.cached == {paths["a"]: 60, paths["b"]: 40}
+
+    prefetcher.release([paths["a"]])
+    assert paths["a"] in prefetcher.cached
+    prefetcher.release([paths["a"]])
+    assert list(prefetcher.cached) == [paths["b"]]
+    assert not prefetcher.pinned
+    prefetcher.close()
+
+
+def test_device_slot(tmp_path):
+    paths = make_files(tmp_path, {"a": 60})
+    scheduler = DeviceScheduler(max_jobs=4, device_jobs={str(tmp_path): 1})
+    device = scheduler.get_device(tmp_path)
+    scheduler.bandwidth[device] = 100
+    prefetcher = Prefetcher(budget=100)
+
+    # a job holds the only slot of the device
+    with scheduler.cond:
+        scheduler.running[device] = 1
+    prefetcher.prefetch([paths["a"]], scheduler)
+    time.sleep(0.1)
+    # not charged to the device bandwidth yet: waiting for the slot
+    assert device not in scheduler.next_read
+
+    with scheduler.cond:
+        scheduler.running[device] = 0
+        scheduler.cond.notify_all()
+    prefetcher.close()
+    assert paths["a"] in prefetcher.cached and device in scheduler.next_read
+    assert scheduler.reads == 0 and not scheduler.running[device]
@@ -0,0 +1,32 @@
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+import time
+from soxcue.profiling import profile
+
+
+def busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_profile(tmp_path):
+    with profile(tmp_path, "stage"):
+        busy(0.1)
+
+    pstats_path = next(tmp_path.glob("stage.*.pstats"))
+    assert any(name == "busy" for _, _, name in pstats.Stats(str(pstats_path)).stats)
+    collapsed = pstats_path.with_suffix(".collapsed").read_text(encoding="utf-8")
+    assert "busy (test_profiling.py" in collapsed
+
+    with profile(None, "stage"):
+        pass
+
+
+def test_profile_threads(tmp_path):
+    with profile(tmp_path, "stage"):
+        with ThreadPoolExecutor() as executor:
+            executor.submit(busy, 0.1).result()
+
+    pstats_path = next(tmp_path.glob("stage.*.pstats"))
+    assert any(name == "busy" for _, _, name in pstats.Stats(str(pstats_path)).stats)
@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from soxcue.schedule import DeviceScheduler, ScheduledJob
+
+
+class Recorder:
+    """
+    Job function recording start order and peak concurrency per device
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started: list[str] = []
+        self.running: dict[int, int] = {}
+        self.peak: dict[int, int] = {}
+        # all devices
+        self.total = 0
+        self.peak_total = 0
+
+    def job(self, key: str, devices: frozenset[int], seconds: float) -> None:
+        with self.lock:
+            self.started.append(key)
+            self.total += 1
+            self.peak_total = max(self.peak_total, self.total)
+            for device in devices:
+                self.running[device] = self.running.get(device, 0) + 1
+                self.peak[device] = max(self.peak.get(device, 0), self.running[device])
+        time.sleep(seconds)
+        with self.lock:
+            self.total -= 1
+            for device in devices:
+                self.running[device] -= 1
+
+    def get_jobs(
+        self, prefix: str, count: int, devices: set[int], seconds: float = 0.05
+    ) -> list[ScheduledJob]:
+        return [
+            ScheduledJob(
+                key=f"{prefix}{idx}",
+                func=self.job,
+                args=(f"{prefix}{idx}", frozenset(devices), seconds),
+                devices=frozenset(devices),
+                read_device=min(devices),
+                nbytes=1024 * 1024,
+            )
+            for idx in range(count)
+        ]
+
+
+def get_scheduler(max_jobs: int, device_jobs=None, bandwidth=None):
+    scheduler = DeviceScheduler(max_jobs=max_jobs)
+    # fake st_dev devices
+    scheduler.device_jobs = device_jobs or {1: None, 2: None, 3: None}
+    scheduler.bandwidth = bandwidth or {}
+    return scheduler
+
+
+def test_round_robin():
+    recorder = Recorder()
+    scheduler = get_scheduler(1)
+    jobs = recorder.get_jobs("a", 3, {1}) + recorder.get_jobs("b", 3, {2})
+    with ThreadPoolExecutor(4) as executor:
+        done = [job.key for job in scheduler.run(executor, jobs)]
+    assert recorder.started == ["a0", "b0", "a1", "b1", "a2", "b2"]
+    assert sorted(done) == sorted(recorder.started)
+
+
+def test_device_limits():
+    recorder = Recorder()
+    scheduler = get_scheduler(4, device_jobs={1: 1, 2: None, 3: 3})
+    # reads device 1 or 2, writes device 3
+    jobs = recorder.get_jobs("a", 3, {1, 3}) + recorder.get_jobs("b", 3, {2, 3})
+    with ThreadPoolExecutor(4) as executor:
+        list(scheduler.run(executor, jobs))
+    assert recorder.peak == {1: 1, 2: 2, 3: 3}
+    assert not any(scheduler.running.values())
+
+
+def test_pacing_source_device():
+    recorder = Recorder()
+    # 10 MB/s: 1 MB jobs start every 0.1s on device 1
+    scheduler = get_scheduler(4, bandwidth={1: 10, 2: 10})
+    jobs = recorder.get_jobs("a", 4, {1}, seconds=0)
+    # reading device 3, writing device 1: not paced by device 1 reads
+    jobs += recorder.get_jobs("b", 4, {1, 3}, seconds=0)
+    for job in jobs[4:]:
+        job.read_device = 3
+    started = time.monotonic()
+    with ThreadPoolExecutor(4) as executor:
+        list(scheduler.run(executor, jobs))
+    assert 0.25 < time.monotonic() - started < 1
+    assert set(recorder.started[:5]) >= {"b0", "b1", "b2", "b3"}
+    assert scheduler.next_read.keys() == {1}
+
+
+def test_concurrent_runs():
+    recorder = Recorder()
+    scheduler = get_scheduler(3, device_jobs={1: 1, 2: None})
+    results = {}
+    finished = {}
+
+    def run(name: str, jobs: list[ScheduledJob]) -> None:
+        results[name] = [job.key for job in scheduler.run(executor, jobs)]
+        finished[name] = time.monotonic()
+
+    with ThreadPoolExecutor(3) as executor:
+        # an HDD album limited to one job at a time, another sheet fills the CPUs
+        threads = [
+            threading.Thread(
+                target=run, args=("a", recorder.get_jobs("a", 3, {1}, seconds=0.2))
+            ),
+            threading.Thread(target=run, args=("b", recorder.get_jobs("b", 6, {2}))),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert sorted(results["a"]) == ["a0", "a1", "a2"]
+    assert len(results["b"]) == 6
+    assert recorder.peak[1] == 1
+    assert recorder.peak_total == 3
+    assert finished["b"] < finished["a"]
+    assert not scheduler.jobs and not scheduler.runs
+
+
+class BrokenExecutor(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+
+def test_broken_executor():
+    recorder = Recorder()
+    scheduler = get_scheduler(2, device_jobs={1: 2})
+    for _ in range(2):
+        jobs = list(scheduler.run(BrokenExecutor(), recorder.get_jobs("a", 2, {1})))
+        assert all(
+            isinstance(job.future.exception(), BrokenProcessPool) for job in jobs
+        )
+    assert not scheduler.jobs and not any(scheduler.running.values())
+    with ThreadPoolExecutor(2) as executor:
+        assert len(list(scheduler.run(executor, recorder.get_jobs("b", 2, {1})))) == 2
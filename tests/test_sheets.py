@@ -1,5 +1,8 @@
 from pathlib import Path
-from .fixtures import soxcue_sheets
+from soxcue.config import PRESETS, OutputTarget
+from soxcue.sheets import DirIndex, SoxcueSheets
+from .fixtures import get_config, soxcue_sheets
+
 
 def test_output_paths(soxcue_sheets):
     assert soxcue_sheets[0].tracks[0].dst_path.parents[0].stem == (
@@ -10,6 +13,7 @@ def test_output_paths(soxcue_sheets):
         "04 - Awesome Artist - Moonchild (Including The Dream And The Illusion).flac"
     )
 
+
 def test_track_properties(soxcue_sheets):
     assert soxcue_sheets[0].tracks[1].songwriter == "the best of the best"
     assert soxcue_sheets[0].tracks[2].songwriter is None
@@ -17,6 +21,7 @@ def test_track_properties(soxcue_sheets):
         'Epitaph (Including "March For No Reason" And "Tomorrow And Tomorrow")'
     )
 
+
 def test_track_timing(soxcue_sheets):
     assert soxcue_sheets[0].tracks[2].start == 807.32
     assert soxcue_sheets[0].tracks[2].end == 1336.123
@@ -35,3 +40,69 @@ def test_track_sox_cmd(soxcue_sheets):
         "Awesome Artist - 1969 - Awesome Album (or maybe not) [800 030-2]/"
         '02 - Awesome Artist - I Talk To The Wind.flac" trim 443.547t =807.32t'
     )
+
+
+def test_dir_index_resolve():
+    dir_index = DirIndex.from_names(
+        Path("/music"), ["Album.FLAC", "album.ape", "cover.png"]
+    )
+    assert dir_index.resolve("cover.png", ["flac"]) == Path("/music/cover.png")
+    assert dir_index.resolve("album.wav", ["wav", "flac"]) == Path("/music/Album.FLAC")
+    assert dir_index.resolve("ALBUM.wav", ["ape", "flac"]) == Path("/music/album.ape")
+    assert dir_index.resolve("other.wav", ["wav", "flac"]) is None
+
+
+def test_output_target_paths(soxcue_sheets):
+    dst_root, dst_paths = SoxcueSheets(config=get_config()).get_output_paths(
+        cue_sheet=soxcue_sheets[0],
+        target=OutputTarget(
+            enc_format="mp3", naming_spec="#c/#n - #t", dst_dir=Path("/portable")
+        ),
+    )
+    assert dst_root == Path("/portable")
+    assert dst_paths[1] == Path("/portable/Awesome Artist/02 - I Talk To The Wind.mp3")
+
+
+def test_preset_target():
+    config = get_config()
+    config.runtime_.preset = PRESETS["fast"]
+    try:
+        target = SoxcueSheets.get_target(OutputTarget(enc_format="flac"), config)
+        assert (target.comp_level, target.rate_quality, target.dither) == (
+            0,
+            "l",
+            False,
+        )
+        target = SoxcueSheets.get_target(
+            OutputTarget(enc_format="flac", comp_level=5, dither=True), config
+        )
+        assert (target.comp_level, target.dither) == (5, True)
+    finally:
+        config.runtime_.preset = PRESETS["balanced"]
+
+
+def test_copy_eligibility():
+    sheets = SoxcueSheets(config=get_config())
+    track = sheets.cue_sheets[0].tracks[0]
+    output = track.outputs[0]
+    # whole source file already in the output format
+    track.start = track.end = 0
+    sheets.set_sox_cmd(track)
+    assert output.copy
+    assert track.backends["decoder"] == "copy"
+    assert track.sox_cmd is None
+
+    for target in [
+        OutputTarget(enc_format="flac", comp_level=8),
+        OutputTarget(enc_format="flac", rate=48000),
+        OutputTarget(enc_format="wav"),
+    ]:
+        output.target = target
+        sheets.set_sox_cmd(track)
+        assert not output.copy
+
+    output.target = OutputTarget(enc_format="flac")
+    track.end = 10
+    sheets.set_sox_cmd(track)
+    assert not output.copy
+    assert " trim 0t =10t" in track.sox_cmd
@@ -0,0 +1,43 @@
+import time
+import pytest
+from mediafile import MediaFile
+import soxcue.engine as soxcue_engine
+from soxcue.config import SimCost
+from soxcue.engine import SoxcueEngine, SoxcueTimeoutError
+from soxcue.simulate import make_library, simulate_process
+
+
+def test_simulate_process(tmp_path):
+    dst_paths = [tmp_path / "01.flac", tmp_path / "01.mp3", tmp_path / "01.wav"]
+    cost = SimCost(fixed=0, per_second=0)
+    result = simulate_process(cost, 180.0, dst_paths, stats=True)
+    assert result == simulate_process(cost, 180.0, dst_paths, stats=True)
+    assert result["levels"]["length"] == 180.0
+    for path in dst_paths:
+        tags = MediaFile(path)
+        tags.title = "One"
+        tags.save()
+        assert MediaFile(path).title == "One"
+
+
+def test_simulate_hang(tmp_path, monkeypatch):
+    monkeypatch.setattr(soxcue_engine, "RETRY_BACKOFF", 0)
+    dst_paths = [tmp_path / "01.flac"]
+    started = time.monotonic()
+    with pytest.raises(SoxcueTimeoutError):
+        SoxcueEngine._retry_process(
+            2,
+            simulate_process,
+            (SimCost(hang_rate=1), 180.0, dst_paths, False, False, 0.2),
+        )
+    # killed on every try, nothing written
+    assert 0.6 < time.monotonic() - started < 5
+    assert not dst_paths[0].exists()
+    assert not soxcue_engine.RUNNING
+
+
+def test_make_library(tmp_path):
+    make_library(tmp_path, sheets=2, tracks=3, seconds=60)
+    album = tmp_path / "Sim Artist - Album 00002"
+    assert "INDEX 01 02:00:00" in (album / "album.cue").read_text(encoding="utf-8")
+    assert MediaFile(album / "album.wav").length == 180
@@ -0,0 +1,44 @@
+import os
+from soxcue import store
+from soxcue.engine import SoxcueEngine
+from soxcue.store import ContentStore, clone_file
+
+
+def test_store_process(tmp_path):
+    calls = []
+
+    def encode(dst_path):
+        calls.append(dst_path)
+        dst_path.write_bytes(b"encoded")
+        return {"levels": {"peak": -1.0, "loudness": -14.0}}
+
+    object_path = ContentStore(tmp_path / "store").get_object_path(
+        "hash", {"start": 0, "end": 0, "enc_format": "flac"}
+    )
+    for name, required in [("01", ["levels"]), ("02", ["levels"]), ("03", ["md5"])]:
+        dst_path = tmp_path / f"{name}.flac"
+        result = SoxcueEngine._store_process(
+            [(object_path, dst_path)], required, encode, (dst_path,)
+        )
+        assert result == {"levels": {"peak": -1.0, "loudness": -14.0}}
+        assert dst_path.read_bytes() == b"encoded"
+    # stored by the first run, the result lacks what the third one requires
+    assert calls == [tmp_path / "01.flac", tmp_path / "03.flac"]
+
+
+def test_clone_file_fallback(tmp_path, monkeypatch):
+    def no_reflink(*args):
+        raise OSError
+
+    def partial_copy(src, dst, count):
+        # some data written before failing
+        monkeypatch.setattr(store.os, "copy_file_range", no_reflink)
+        return copy_file_range(src, dst, 5)
+
+    copy_file_range = os.copy_file_range
+    monkeypatch.setattr(store.fcntl, "ioctl", no_reflink)
+    monkeypatch.setattr(store.os, "copy_file_range", partial_copy)
+    src_path = tmp_path / "src.flac"
+    src_path.write_bytes(os.urandom(3 << 20))
+    clone_file(src_path, tmp_path / "dst.flac")
+    assert (tmp_path / "dst.flac").read_bytes() == src_path.read_bytes()
@@ -0,0 +1,19 @@
+import io
+import tarfile
+from soxcue.stream import TarStream
+
+
+def test_tar_stream(tmp_path):
+    path = tmp_path / "Album" / "01 - One.flac"
+    path.parent.mkdir()
+    path.write_bytes(b"audio")
+    fileobj = io.BytesIO()
+    stream = TarStream(fileobj)
+    stream.add([(path, tmp_path)])
+    stream.close()
+
+    assert not path.exists()
+    fileobj.seek(0)
+    with tarfile.open(fileobj=fileobj) as tar:
+        assert tar.getnames() == ["Album/01 - One.flac"]
+        assert tar.extractfile("Album/01 - One.flac").read() == b"audio"
@@ -8,3 +8,21 @@ tags = Tags(cue_sheet=cue_sheets[0], config=get_config())
 def test_tags():
     track_tags = tags.get_track_tags(cue_sheets[0].tracks[0])
     assert track_tags["tags"]["title"] == '21st Century Schizoid Man (Including "Mirrors")'
+
+def test_gain_tags():
+    levels = [
+        {"peak": -1.0, "loudness": -14.0, "blocks": [[-140, 1000]]},
+        # quiet track: its blocks are under the album relative gate
+        {"peak": -6.0, "loudness": -30.0, "blocks": [[-300, 500]]},
+    ]
+    assert tags.get_gain_tags(levels[:1]) == {
+        "rg_track_gain": -4.0,
+        "rg_track_peak": 0.891251,
+    }
+    assert tags.get_gain_tags(levels, album=True)["rg_album_gain"] == -4.0
+
+def test_tags_key():
+    track_tags = tags.get_track_tags(cue_sheets[0].tracks[0])["tags"]
+    tags_key = tags.get_tags_key(track_tags)
+    assert tags.get_tags_key(dict(track_tags)) == tags_key
+    assert tags.get_tags_key({**track_tags, "title": "Mirrors"}) != tags_key
@@ -0,0 +1,27 @@
+import pytest
+from soxcue.checksums import PcmChecksums
+from soxcue.verify import SoxcueVerify, SoxcueVerifyError
+
+
+def test_verify_track(tmp_path):
+    path = tmp_path / "01.raw"
+    path.write_bytes(bytes(range(256)) * 64)
+    checksums = PcmChecksums(accuraterip=(False, False))
+    checksums.update(path.read_bytes())
+    record = {
+        "pcm": {"rate": 44100, "bits": 16, "channels": 2},
+        "accuraterip": [False, False],
+        **checksums.result(sample_size=4),
+    }
+    assert SoxcueVerify._verify_track(path, f"cat '{path}'", record) == []
+
+    path.write_bytes(bytes(256) * 64)
+    assert SoxcueVerify._verify_track(path, f"cat '{path}'", record) == [
+        "md5",
+        "arv1",
+        "arv2",
+    ]
+    with pytest.raises(SoxcueVerifyError, match="exited with 1"):
+        SoxcueVerify._verify_track(path, "false", record)
+    with pytest.raises(SoxcueVerifyError, match="missing"):
+        SoxcueVerify._verify_track(tmp_path / "02.raw", f"cat '{path}'", record)
@@ -0,0 +1,28 @@
+from soxcue.walker import DirWalker
+
+
+def test_walk(tmp_path):
+    for name in [
+        "a/Album.CUE",
+        "a/album2.cue",
+        "a/Album.flac",
+        "a/Folder.JPG",
+        "a/tracks/x/ignored.cue",
+        "a/.soxcue/ignored.cue",
+        "b/skip/ignored.cue",
+        "b/deep/deeper/ignored.cue",
+        "b/deep/one.cue",
+    ]:
+        tmp_path.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.joinpath(name).touch()
+
+    found = DirWalker(audio_formats=["flac"], exclude=["skip"], max_depth=2).walk(
+        tmp_path
+    )
+    assert [x.directory for x in found] == [tmp_path / "a", tmp_path / "b/deep"]
+    assert found[0].cues == ["Album.CUE", "album2.cue"]
+    assert found[0].covers == ["Folder.JPG"]
+    assert found[0].audio == ["Album.flac"]
+
+    found = DirWalker(audio_formats=["flac"], include=["a/album*"]).walk(tmp_path)
+    assert [x.cues for x in found] == [["album2.cue"]]